@@ -0,0 +1,142 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+
+from metrics import span
+
+#LLM call priorities, lower runs first: finishing answers beats starting new ones beats write-back
+GENERATION = 0
+ROUTING = 1
+BACKGROUND = 2
+
+
+class Overloaded(Exception):
+    """Raised instead of queueing when the LLM wait queue is full, answered with 503 and Retry-After."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many requests in flight, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """Caps concurrent LLM calls at `limit` and hands free slots out by priority, then arrival.
+
+    At most `max_waiting` interactive calls queue, for up to `timeout` seconds each, anything
+    beyond that is shed with Overloaded. BACKGROUND calls are never shed, they wait their turn.
+    """
+
+    def __init__(self, limit=16, max_waiting=64, timeout=10.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self.in_use = 0
+        #Heap of (priority, arrival, future), cancelled futures are skipped when popped
+        self.waiters = []
+        self.arrivals = itertools.count()
+        self.waiting = 0
+        self.waiting_interactive = 0
+
+        #Metrics
+        self.shed = 0
+        self.held = 0
+        self.hold_seconds = 0.0
+
+    def retry_after(self) -> int:
+        #Time for the current backlog to drain at the average call duration, at least a second
+        average = self.hold_seconds / self.held if self.held else 1.0
+        return max(1, math.ceil(average * (self.waiting_interactive + 1) / self.limit))
+
+    def admit(self):
+        """Shed a new request up front when the interactive queue is already full."""
+        if self.waiting_interactive >= self.max_waiting:
+            self.shed += 1
+            raise Overloaded(self.retry_after())
+
+    async def acquire(self, priority=GENERATION):
+        if self.in_use < self.limit and not self.waiting:
+            self.in_use += 1
+            return
+        interactive = priority < BACKGROUND
+        if interactive:
+            self.admit()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.arrivals), future))
+        self.waiting += 1
+        self.waiting_interactive += interactive
+        try:
+            await asyncio.wait_for(future, self.timeout if interactive else None)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            raise Overloaded(self.retry_after()) from None
+        except BaseException:
+            if future.done() and not future.cancelled():
+                #The slot was handed over just as this waiter was cancelled, pass it on
+                self.release()
+            raise
+        finally:
+            self.waiting -= 1
+            self.waiting_interactive -= interactive
+
+    def release(self):
+        #Hand the slot straight to the next live waiter so a new arrival cannot jump the queue
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority=GENERATION):
+        with span("llm_queue"):
+            await self.acquire(priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.held += 1
+            self.hold_seconds += time.monotonic() - started
+            self.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "waiting_interactive": self.waiting_interactive,
+            "shed": self.shed,
+            "avg_hold_seconds": round(self.hold_seconds / self.held, 3) if self.held else 0.0,
+        }
+
+
+class SingleFlight:
+    """Concurrent calls with the same key share one in-flight computation."""
+
+    def __init__(self):
+        self.in_flight = {}
+
+        #Metrics
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, start):
+        pending = self.in_flight.get(key)
+        if pending is None:
+            self.leaders += 1
+            pending = asyncio.ensure_future(start())
+            self.in_flight[key] = pending
+            pending.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.followers += 1
+        #A caller that goes away does not cancel the work the others are waiting on
+        return await asyncio.shield(pending)
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self.in_flight),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
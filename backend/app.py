@@ -1,29 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager, nullcontext
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional
+import asyncio
+import json
 import os
 import re
-import requests
+import time
+import httpx
 from dotenv import load_dotenv
 
-from langchain_core.runnables import RunnablePassthrough
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser, StrOutputParser
 from langchain_community.graphs import Neo4jGraph
-from langchain.chat_models import AzureChatOpenAI
 from langchain_openai import AzureOpenAIEmbeddings
 from langchain_community.vectorstores import Neo4jVector
+from langchain_community.vectorstores.neo4j_vector import SearchType
 from langchain_experimental.graph_transformers import LLMGraphTransformer
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.schema.document import Document
-from neo4j import GraphDatabase
+from neo4j import AsyncDriver, AsyncGraphDatabase, RoutingControl
+
+from admission import BACKGROUND, GENERATION, ROUTING, Overloaded, PriorityLimiter, SingleFlight
+from backfill import EmbeddingBackfill
+from cache import NeighborhoodCache, SemanticCache, normalize_question
+from chat_model import build_chat_model
+from context import ContextPacker
+from embedding_cache import CachedEmbeddings
+from gazetteer import EntityGazetteer
+from ingest import GraphIngestQueue
+from metrics import ANSWERS, CONTEXT_TOKENS, STAGE_SECONDS, Gauges, TokenUsageCallback, registry, server_timing, span, start_trace
+from places import PLACES_ENDPOINT, PlacesClient, PlacesError
+from router import IntentRouter
+from store_locator import StoreLocator, rank_by_distance
+from vector_mirror import LocalVectorIndex
 
 #load environment variables from .env file
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    #Connect in the background so the server takes traffic straight away, /ready reports when it is done
+    startup = asyncio.create_task(warm_up())
+    yield
+    startup.cancel()
+    await embedding_backfill.stop()
+    #Flush pending write-back documents, then release pooled connections
+    if ingest_queue.worker is not None:
+        await ingest_queue.drain()
+    await http_client.aclose()
+    await neo4j_driver.close()
+
 #Initialize app
-app = FastAPI(title="Made with Nestlé Chatbot API")
+app = FastAPI(title="Made with Nestlé Chatbot API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],  
@@ -60,40 +91,97 @@ class Locate(BaseModel):
         description="List of products the user is looking for.",
     )
 
+#Entity labels treated as product names by the intent router
+PRODUCT_LABELS = [label.strip() for label in os.getenv("PRODUCT_LABELS", "Product,Brand").split(",") if label.strip()]
+
+#Tags that label LLM token metrics by chain
+LLM_CHAINS = ("entity", "locate", "answer", "graph_transform")
+
+ANSWER_TEMPLATE = """Answer the question based only on the following context and add a url of the source of the information if any towards the end of the statement. Never make up a url: {context}
+
+    Question: {question}
+    Use natural language and be friendly. Answer:"""
+
+def fake_services(value: str) -> set[str]:
+    #fakes is only imported when something is faked, production never loads it
+    if not value.strip():
+        return set()
+    from fakes import enabled_services
+    return enabled_services(value)
+
+#Services replaced by deterministic local fakes for offline benchmarks, e.g. FAKE_SERVICES=all
+FAKE_SERVICES = fake_services(os.getenv("FAKE_SERVICES", ""))
+
+def build_llm(**overrides):
+    """The shared Azure chat model with token usage metrics for every chain."""
+    return build_chat_model(**{"callbacks": [TokenUsageCallback(LLM_CHAINS)], **overrides})
+
 def init_components():
-    #Initialize Neo4j Graph DB connection
-    graph = Neo4jGraph()
+    """Create clients and chains. Nothing here talks to Neo4j or Azure, connections are opened on first use."""
+    #Async driver with its own connection pool for the request path
+    if "neo4j" in FAKE_SERVICES:
+        from fakes import FakeNeo4jDriver, Latency
+        neo4j_driver = FakeNeo4jDriver(latency=Latency.from_env("neo4j"))
+    else:
+        neo4j_driver = AsyncGraphDatabase.driver(
+            os.getenv("NEO4J_URI"),
+            auth=(os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD")),
+            max_connection_pool_size=int(os.getenv("NEO4J_POOL_SIZE", "50")),
+        )
+
+    #Pooled HTTP client for the Places API
+    transport = None
+    if "places" in FAKE_SERVICES:
+        from fakes import Latency, places_transport
+        transport = places_transport(Latency.from_env("places"))
+    http_client = httpx.AsyncClient(
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+        transport=transport,
+    )
     
     #Initialize Azure OpenAI components
-    llm = AzureChatOpenAI(
-        deployment_name=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-        openai_api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        temperature=0
-    )
+    if "llm" in FAKE_SERVICES:
+        from fakes import FakeChatModel, Latency
+        llm_latency = Latency.from_env("llm")
+        llm = FakeChatModel(
+            latency_ms=llm_latency.ms,
+            token_ms=float(os.getenv("FAKE_LLM_TOKEN_MS", "0")),
+            jitter=llm_latency.jitter,
+            callbacks=[TokenUsageCallback(LLM_CHAINS)],
+        )
+    else:
+        llm = build_llm()
     
     # Initialize LLM Graph Transformer
     llm_transformer = LLMGraphTransformer(llm=llm)
     
-    # Initialize embeddings
-    embeddings = AzureOpenAIEmbeddings(
-        model=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"),
-        openai_api_key=os.getenv("AZURE_OPENAI_EMBEDDINGS_API"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDINGS_ENDPOINT"),
-        openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
-        openai_api_type="azure"
-    )
+    # Initialize embeddings, cached by content hash and shared with the graph-prep pipeline
+    if "embeddings" in FAKE_SERVICES:
+        from fakes import FakeEmbeddings, Latency
+        #Memory only, fake vectors must never end up in the shared disk cache
+        embeddings = CachedEmbeddings(FakeEmbeddings(latency=Latency.from_env("embeddings")), namespace="fake")
+    else:
+        embeddings = CachedEmbeddings(
+            AzureOpenAIEmbeddings(
+                model=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"),
+                openai_api_key=os.getenv("AZURE_OPENAI_EMBEDDINGS_API"),
+                azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDINGS_ENDPOINT"),
+                openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+                openai_api_type="azure"
+            ),
+            cache_dir=os.getenv("EMBEDDING_CACHE_DIR", ".embedding_cache"),
+            namespace=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT", ""),
+        )
     
-    # Initialize vector store
-    vector_index = Neo4jVector.from_existing_graph(
+    #Answer cache for the RAG branch, shares the embeddings client
+    answer_cache = SemanticCache(
         embeddings,
-        search_type="hybrid",
-        node_label="Document",
-        text_node_properties=["text"],
-        embedding_node_property="embedding"
+        threshold=float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95")),
+        max_entries=int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "2048")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600")),
+        max_bytes=int(os.getenv("ANSWER_CACHE_MAX_MB", "64")) * 1024 * 1024,
     )
-    vector_retriever = vector_index.as_retriever()
 
     parser = PydanticOutputParser(pydantic_object=Entities)
     
@@ -125,51 +213,131 @@ def init_components():
         ),
     ])
     #Create a chain to determine if the user is looking for a location
-    locate_chain = locate_prompt.partial(format_instructions=locate_parser.get_format_instructions()) | llm | locate_parser
+    locate_chain = (locate_prompt.partial(format_instructions=locate_parser.get_format_instructions()) | llm | locate_parser).with_config(tags=["locate"])
     
     #create entity chain
-    entity_chain = entity_prompt.partial(format_instructions=parser.get_format_instructions()) | llm | parser
+    entity_chain = (entity_prompt.partial(format_instructions=parser.get_format_instructions()) | llm | parser).with_config(tags=["entity"])
 
-    template = """Answer the question based only on the following context and add a url of the source of the information if any towards the end of the statement. Never make up a url: {context}
+    prompt = ChatPromptTemplate.from_template(ANSWER_TEMPLATE)
+
+    #Generation stage only, retrieval runs separately so it can overlap with locate_chain
+    chain = (prompt | llm | StrOutputParser()).with_config(tags=["answer"])
     
-    Question: {question}
-    Use natural language and be friendly. Answer:"""
-    prompt = ChatPromptTemplate.from_template(template)
-
-    chain = (
-        {
-            "context": lambda question: full_retriever(question, graph, vector_retriever, entity_chain),
-            "question": RunnablePassthrough(),
-        }
-        | prompt
-        | llm
-        | StrOutputParser()
+    return neo4j_driver, embeddings, entity_chain, locate_chain, chain, llm_transformer, http_client, answer_cache
+
+def connect_graph():
+    #Initialize Neo4j Graph DB connection, only used for write-back so the schema is not needed
+    if "neo4j" in FAKE_SERVICES:
+        from fakes import FakeNeo4jGraph, Latency
+        return FakeNeo4jGraph(latency=Latency.from_env("neo4j"))
+    return Neo4jGraph(refresh_schema=False)
+
+#Same retrieval query Neo4jVector.from_existing_graph builds for text_node_properties=["text"]
+VECTOR_RETRIEVAL_QUERY = (
+    "RETURN reduce(str='', k IN ['text'] | str + '\\n' + k + ': ' + coalesce(node[k], '')) AS text, "
+    "node {.*, `embedding`: Null, id: Null, `text`: Null} AS metadata, score"
+)
+
+def build_vector_retriever(embeddings):
+    """Open the hybrid Document index like Neo4jVector.from_existing_graph, without embedding every
+    Document up front. Missing embeddings are filled in by the background EmbeddingBackfill."""
+    if "neo4j" in FAKE_SERVICES:
+        from fakes import FakeVectorRetriever, Latency
+        return FakeVectorRetriever(embeddings, latency=Latency.from_env("neo4j"), k=int(os.getenv("VECTOR_TOP_K", "8")))
+    vector_index = Neo4jVector(
+        embedding=embeddings,
+        search_type=SearchType.HYBRID,
+        node_label="Document",
+        embedding_node_property="embedding",
+        text_node_property="text",
+        index_name="vector",
+        keyword_index_name="keyword",
+        retrieval_query=VECTOR_RETRIEVAL_QUERY,
     )
-    
-    return graph, vector_retriever, entity_chain, locate_chain, chain, llm_transformer
+    #Create the vector and keyword indexes on a fresh database
+    embedding_dimension, _ = vector_index.retrieve_existing_index()
+    if not embedding_dimension:
+        vector_index.create_new_index()
+    if not vector_index.retrieve_existing_fts_index(["text"]):
+        vector_index.create_new_keyword_index(["text"])
+    #Fetch a few more chunks than fit in the prompt, the context packer keeps the best ones
+    return vector_index.as_retriever(search_kwargs={"k": int(os.getenv("VECTOR_TOP_K", "8"))})
 
 def get_text_chunks_langchain(text):
     text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=100)
     docs = [Document(page_content=x) for x in text_splitter.split_text(text)]
     return docs
 
-def add_to_graph(documents, graph, llm_transformer):
-    """Add documents to the graph database"""
+#Relationships of a write that are not in the graph yet, checked before writing
+NEW_FACTS_QUERY = """
+UNWIND $facts AS f
+OPTIONAL MATCH (:__Entity__ {id: f.source})-[r]->(:__Entity__ {id: f.target})
+WHERE type(r) = f.type
+WITH f, count(r) AS existing
+WHERE existing = 0
+RETURN f.source AS source, f.target AS target
+"""
+
+async def new_fact_ids(driver: AsyncDriver, graph_documents) -> set[str]:
+    """Entity ids of relationships the graph does not have yet. If the check fails every id counts as new."""
+    facts = [
+        #Same type normalization as Neo4jGraph.add_graph_documents
+        {"source": rel.source.id, "type": rel.type.replace(" ", "_").upper().replace("`", ""), "target": rel.target.id}
+        for graph_doc in graph_documents for rel in graph_doc.relationships
+    ]
+    if not facts:
+        return set()
+    try:
+        records, _, _ = await driver.execute_query(NEW_FACTS_QUERY, {"facts": facts}, routing_=RoutingControl.READ)
+    except Exception as e:
+        print(f"Error checking for new facts: {str(e)}")
+        return {fact[end] for fact in facts for end in ("source", "target")}
+    return {record[end] for record in records for end in ("source", "target")}
+
+async def add_to_graph(documents, graph, llm_transformer, max_concurrency=4, on_write=(), limiter: PriorityLimiter = None,
+                       driver: AsyncDriver = None, on_new_facts=()):
+    """Add documents to the graph database.
+
+    on_write callbacks get every entity id written. on_new_facts callbacks get the ids of
+    relationships that were not in the graph before, with the texts the write came from."""
     if not documents:
         return
-        
+
+    #Bound the number of graph transformer calls in flight at once
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def convert(doc):
+        #Graph extraction only gets LLM slots that no request is waiting for
+        async with semaphore, (limiter.slot(BACKGROUND) if limiter is not None else nullcontext()):
+            return await llm_transformer.aconvert_to_graph_documents([doc], config={"tags": ["graph_transform"]})
+
+    with span("graph_transform"):
+        results = await asyncio.gather(*(convert(doc) for doc in documents), return_exceptions=True)
     graph_documents = []
-    for doc in documents:
-        graph_doc = llm_transformer.convert_to_graph_documents([doc])
-        graph_documents.extend(graph_doc)
-    print(f"Adding {len(graph_documents)} documents to the graph")
-    print("Graph documents:", graph_documents)
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"Error converting document to graph: {str(result)}")
+            continue
+        graph_documents.extend(result)
     if graph_documents:
-        graph.add_graph_documents(
-            graph_documents,
-            baseEntityLabel=True,
-            include_source=True
-        )
+        #Answers only go stale when the write adds something, most write-backs repeat known facts
+        new_ids = await new_fact_ids(driver, graph_documents) if driver is not None and on_new_facts else set()
+        #One bulk write per batch, Neo4jGraph is synchronous so it runs in a worker thread
+        with span("graph_write"):
+            await asyncio.to_thread(
+                graph.add_graph_documents,
+                graph_documents,
+                baseEntityLabel=True,
+                include_source=True
+            )
+        #Let caches and indexes react to the entity ids just written
+        touched = {node.id for graph_doc in graph_documents for node in graph_doc.nodes}
+        for callback in on_write:
+            callback(touched)
+        if new_ids:
+            sources = [doc.page_content for doc in documents]
+            for callback in on_new_facts:
+                callback(new_ids, sources)
 
 def remove_lucene_chars(text):
     """
@@ -195,126 +363,199 @@ def generate_full_text_query(input_text: str) -> str:
     if not words:
         return ""
     full_text_query = " AND ".join([f"{word}~2" for word in words])
-    print(f"Generated Query: {full_text_query}")
     return full_text_query.strip()
 
-def graph_retriever(question: str, graph: Neo4jGraph, entity_chain) -> str:
+#Fuzzy fulltext lookup for every entity in one round trip, each entity gets its own ranked
+#neighborhood so it can be cached on its own, along with the node ids it was built from
+NEIGHBORHOOD_QUERY = """
+UNWIND $queries AS q
+CALL db.index.fulltext.queryNodes('fulltext_entity_id', q.query, {limit: 7})
+YIELD node, score
+CALL {
+  WITH node
+  MATCH (node)-[r:!MENTIONS]->(neighbor)
+  RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output, neighbor.id AS neighbor
+  UNION ALL
+  WITH node
+  MATCH (node)<-[r:!MENTIONS]-(neighbor)
+  RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output, neighbor.id AS neighbor
+}
+WITH q, output, max(score) AS score, collect(node.id)[0] AS source, collect(neighbor)[0] AS neighbor
+ORDER BY q.rank, score DESC
+WITH q, collect({output: output, ids: [source, neighbor]})[..$per_entity] AS rows
+UNWIND rows AS row
+RETURN q.rank AS rank, row.output AS output, row.ids AS ids
+"""
+
+#Most connected entities, used to pre-warm the neighborhood cache
+TOP_ENTITIES_QUERY = """
+MATCH (n:__Entity__)
+RETURN n.id AS id
+ORDER BY COUNT { (n)-[:!MENTIONS]-() } DESC
+LIMIT $limit
+"""
+
+async def query_neighborhoods(driver: AsyncDriver, entities: list[str], per_entity=50, limit=150,
+                              cache: NeighborhoodCache = None) -> dict[str, list[str]]:
+    """Fetch the ranked neighborhood of each entity, cached ones locally and the rest in one batched query."""
+    queries = []
+    for entity in entities:
+        query = generate_full_text_query(entity)
+        #skip empty and repeated queries
+        if query and all(q["query"] != query for q in queries):
+            queries.append({"rank": len(queries), "entity": entity, "query": query})
+
+    found = {}
+    missing = []
+    for q in queries:
+        outputs = cache.get(q["query"]) if cache is not None else None
+        if outputs is None:
+            missing.append({**q, "rank": len(missing)})
+        else:
+            found[q["query"]] = outputs
+
+    if missing:
+        records, _, _ = await driver.execute_query(
+            NEIGHBORHOOD_QUERY,
+            {"queries": missing, "per_entity": per_entity},
+            routing_=RoutingControl.READ,
+        )
+        rows = {q["rank"]: ([], set()) for q in missing}
+        for record in records:
+            outputs, ids = rows[record["rank"]]
+            outputs.append(record["output"])
+            ids.update(record["ids"])
+        for q in missing:
+            outputs, ids = rows[q["rank"]]
+            found[q["query"]] = outputs
+            if cache is not None:
+                cache.set(q["query"], q["entity"], outputs, ids)
+
+    #Keep each triple once, for the highest ranked entity that reached it
+    neighborhoods = {q["entity"]: [] for q in queries}
+    seen = set()
+    for q in queries:
+        for output in found[q["query"]]:
+            if len(seen) >= limit:
+                return neighborhoods
+            if output not in seen:
+                seen.add(output)
+                neighborhoods[q["entity"]].append(output)
+    return neighborhoods
+
+async def prewarm_neighborhoods(driver: AsyncDriver, cache: NeighborhoodCache, top_n: int, per_entity=50, batch_size=50) -> int:
+    """Load the neighborhoods of the top_n most connected entities into the cache."""
+    records, _, _ = await driver.execute_query(TOP_ENTITIES_QUERY, {"limit": top_n}, routing_=RoutingControl.READ)
+    entities = [record["id"] for record in records if record["id"]]
+    for i in range(0, len(entities), batch_size):
+        await query_neighborhoods(driver, entities[i:i + batch_size], per_entity=per_entity, limit=0, cache=cache)
+    return len(entities)
+
+async def graph_retriever(question: str, driver: AsyncDriver, entity_chain, gazetteer: EntityGazetteer = None,
+                          cache: NeighborhoodCache = None, limiter: PriorityLimiter = None) -> list[str]:
     #Collects the neighborhood of entities mentioned in the question
-    result = ""
+    result = []
     try:
-        entities = entity_chain.invoke(question)
-        
-        for entity in entities.link:
-            #Prepare the entity before using in query
-            sanitized_entity = remove_lucene_chars(entity)
-            
-            #skip empty queries
-            if not sanitized_entity:
-                continue
-            
-            try:
-                response = graph.query(
-                    """CALL db.index.fulltext.queryNodes('fulltext_entity_id', $query, {limit:7})
-                    YIELD node,score
-                    CALL {
-                      WITH node
-                      MATCH (node)-[r:!MENTIONS]->(neighbor)
-                      RETURN node.id + ' - ' + type(r) + ' -> ' + neighbor.id AS output
-                      UNION ALL
-                      WITH node
-                      MATCH (node)<-[r:!MENTIONS]-(neighbor)
-                      RETURN neighbor.id + ' - ' + type(r) + ' -> ' +  node.id AS output
-                    }
-                    RETURN output LIMIT 50
-                    """,
-                    {"query": sanitized_entity},
-                )
-                result += "\n".join([el['output'] for el in response])
-            except Exception as e:
-                print(f"Error querying graph for entity '{entity}': {str(e)}")
-                #Carry on with next entity rather than failing completely
-                continue
-    
+        #Try the local gazetteer first and only ask the LLM when nothing matches
+        with span("entity_gazetteer"):
+            entities = gazetteer.match(question) if gazetteer is not None else []
+        if not entities:
+            with span("entity_llm"):
+                async with limiter.slot(ROUTING) if limiter is not None else nullcontext():
+                    entities = (await entity_chain.ainvoke(question)).link
     except Exception as e:
         print(f"Error in entity extraction: {str(e)}")
         #return empty result rather than crashing
-        pass
-    
+        return result
+
+    try:
+        with span("graph_query"):
+            neighborhoods = await query_neighborhoods(
+                driver,
+                entities,
+                per_entity=int(os.getenv("GRAPH_ROWS_PER_ENTITY", "50")),
+                limit=int(os.getenv("GRAPH_ROW_LIMIT", "150")),
+                cache=cache,
+            )
+        result = [output for outputs in neighborhoods.values() for output in outputs]
+    except Exception as e:
+        print(f"Error querying graph for entities {entities}: {str(e)}")
+
     return result
 
 #function to combine graph data and vector data
-def full_retriever(question: str, graph: Neo4jGraph, vector_retriever, entity_chain):
-    graph_data = graph_retriever(question, graph, entity_chain)
-    vector_data = [el.page_content for el in vector_retriever.invoke(question)]
-    final_data = f"""Graph data:
-    {graph_data}\n\nVector data:
-    {"". join(vector_data)}
-    """
+async def full_retriever(question: str, driver: AsyncDriver, vector_retriever, entity_chain, packer: ContextPacker,
+                         gazetteer: EntityGazetteer = None, cache: NeighborhoodCache = None,
+                         limiter: PriorityLimiter = None) -> str:
+    async def vector_search():
+        #Until the vector index is open, answer from the graph alone
+        if vector_retriever is None:
+            return []
+        with span("vector_search"):
+            return await vector_retriever.ainvoke(question)
+
+    #Entity extraction + graph lookup and vector search are independent so run them together
+    graph_data, vector_docs = await asyncio.gather(
+        graph_retriever(question, driver, entity_chain, gazetteer, cache, limiter),
+        vector_search(),
+    )
+    #Dedupe, rank against the question and keep what fits in the token budget
+    with span("context_pack"):
+        final_data, report = packer.pack(question, graph_data, vector_docs)
+    CONTEXT_TOKENS.observe(report["prompt_tokens"], part="prompt")
+    CONTEXT_TOKENS.observe(report["context_tokens"], part="context")
     return final_data
 
-def calculate_distance(lat1, lon1, lat2, lon2):
-    from math import radians, sin, cos, sqrt, atan2
-    #convert latitude and longitude from degrees to radians
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-    dlon = lon2 - lon1
-    dlat = lat2 - lat1
-    d = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    r = 6371 
-    distance = 2 * r * atan2(sqrt(d), sqrt(1 - d))
-    return distance
-
-#Get the location of items
-def get_location(items: list[str], lat, lng) -> str:
-    API_KEY = os.getenv("GOOGLE_MAPS_API_KEY")
-    endpoint_url = 'https://maps.googleapis.com/maps/api/place/nearbysearch/json'
+def location_header(items: list[str]) -> str:
     if len(items)==1:
-        output = " **Nearby Locations for Requested Item:**\n"
-    else:
-        output = " **Nearby Locations for Requested Items:**\n"
-    for item in items:
-        params = {
-            'keyword': item,
-            'location': f'{lat},{lng}',
-            'radius': 10500,
-            'key': API_KEY
-        }
-
-        response = requests.get(endpoint_url, params=params)
-
-        if response.status_code == 200:
-            data = response.json()
-            results = data.get('results', [])[:4] 
-
-            if results:
-                output += f"\n • **Top matches for _{item.upper()}_:**\n"
-                for idx, place in enumerate(results, start=1):
-                    name = place.get('name', 'N/A')
-                    address = place.get('vicinity', 'No address found')
-                    lat2 = place['geometry']['location']['lat']
-                    lng2 = place['geometry']['location']['lng']
-                    distance = calculate_distance(lat, lng, lat2, lng2)
-
-                    open_now = place.get("opening_hours", {}).get("open_now", None)
-                    if open_now is True:
-                        status = 'Open'
-                    elif open_now is False:
-                        status = 'Closed'
-                    else:
-                        status = 'Availability Unknown'
-                    
-                    output += (
-                        f"  {idx}. **{name}**\n"
-                        f"      Address: {address}\n"
-                        f"      Distance: {distance:.2f} km\n"
-                        f"      Status: {status}\n"
-                        f"      [View on Google Maps](https://www.google.com/maps/search/?api=1&query={lat2},{lng2})\n"
-                    )
-            else:
-                output += f"\n No nearby places found for _{item.upper()}_.\n"
+        return " **Nearby Locations for Requested Item:**\n"
+    return " **Nearby Locations for Requested Items:**\n"
+
+#Get the nearby locations of a single item
+async def get_item_location(item: str, lat, lng, places: PlacesClient, store_locator: StoreLocator = None) -> str:
+    #Use the offline store index when it covers this product and area
+    with span("store_locator"):
+        results = store_locator.nearest(item, lat, lng, k=4, radius_km=10.5) if store_locator is not None else []
+    if not results:
+        try:
+            with span("places"):
+                results = await places.nearby(item, lat, lng, radius=10500)
+        except PlacesError as e:
+            return f"\n Error {e.status_code} while searching for _{item}_: {e.text}\n"
+
+    if not results:
+        return f"\n No nearby places found for _{item.upper()}_.\n"
+
+    output = f"\n • **Top matches for _{item.upper()}_:**\n"
+    for idx, (place, distance) in enumerate(rank_by_distance(results, lat, lng)[:4], start=1):
+        name = place.get('name', 'N/A')
+        address = place.get('vicinity', 'No address found')
+        lat2 = place['geometry']['location']['lat']
+        lng2 = place['geometry']['location']['lng']
+
+        open_now = place.get("opening_hours", {}).get("open_now", None)
+        if open_now is True:
+            status = 'Open'
+        elif open_now is False:
+            status = 'Closed'
         else:
-            output += f"\n Error {response.status_code} while searching for _{item}_: {response.text}\n"
+            status = 'Availability Unknown'
+        
+        output += (
+            f"  {idx}. **{name}**\n"
+            f"      Address: {address}\n"
+            f"      Distance: {distance:.2f} km\n"
+            f"      Status: {status}\n"
+            f"      [View on Google Maps](https://www.google.com/maps/search/?api=1&query={lat2},{lng2})\n"
+        )
+    return output
 
-    return output.strip()
+#Get the location of items
+async def get_location(items: list[str], lat, lng, places: PlacesClient, store_locator: StoreLocator = None) -> str:
+    #Cache misses for different products are fetched concurrently over the pooled client
+    with span("location"):
+        sections = await asyncio.gather(*(get_item_location(item, lat, lng, places, store_locator) for item in items))
+    return (location_header(items) + "".join(sections)).strip()
 
 def get_amazon_links(items: list[str]) -> str:
     base_url = f"https://www.amazon.ca/s?k="
@@ -328,41 +569,389 @@ def get_amazon_links(items: list[str]) -> str:
     return output.strip()
 
 
-#Initialize components
-graph, vector_retriever, entity_chain, locate_chain, chain, llm_transformer = init_components()
+#Initialize components, the graph connection and vector index are opened by warm_up
+neo4j_driver, embeddings, entity_chain, locate_chain, chain, llm_transformer, http_client, answer_cache = init_components()
+graph = None
+vector_retriever = None
+
+#Context assembly for the RAG prompt, bounded by CONTEXT_TOKEN_BUDGET
+context_packer = ContextPacker(
+    budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+    graph_share=float(os.getenv("CONTEXT_GRAPH_SHARE", "0.35")),
+    template=ANSWER_TEMPLATE,
+)
+
+#Places lookups are cached per product and geohash cell, PLACES_ENDPOINT can point at a local stub
+places_client = PlacesClient(
+    http_client,
+    api_key=os.getenv("GOOGLE_MAPS_API_KEY"),
+    endpoint_url=os.getenv("PLACES_ENDPOINT", PLACES_ENDPOINT),
+    precision=int(os.getenv("PLACES_GEOHASH_PRECISION", "6")),
+    max_entries=int(os.getenv("PLACES_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("PLACES_CACHE_TTL_SECONDS", "900")),
+)
+
+#Optional offline store locator loaded at startup, the Places API is only used where it has no coverage
+store_locator = None
+
+#Local entity matcher, the entity LLM call is only a fallback
+gazetteer = EntityGazetteer()
+
+#Local "where can I buy it" classifier, locate_chain only sees the questions it is unsure about
+product_gazetteer = EntityGazetteer(with_aliases=True)
+intent_router = IntentRouter(product_gazetteer, threshold=float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.85")))
+
+#Neighborhoods of popular entities are served from memory, the graph is almost static
+neighborhood_cache = NeighborhoodCache(
+    max_entries=int(os.getenv("NEIGHBORHOOD_CACHE_MAX_ENTRIES", "4096")),
+    ttl=float(os.getenv("NEIGHBORHOOD_CACHE_TTL_SECONDS", "3600")),
+    max_bytes=int(os.getenv("NEIGHBORHOOD_CACHE_MAX_MB", "32")) * 1024 * 1024,
+)
+
+#With VECTOR_BACKEND=local, vector search runs on an in-process mirror of the Document index
+vector_mirror = LocalVectorIndex(embeddings, k=int(os.getenv("VECTOR_TOP_K", "8"))) if os.getenv("VECTOR_BACKEND") == "local" else None
+
+#Every LLM call takes a slot, user-facing generation first and graph extraction last
+llm_limiter = PriorityLimiter(
+    limit=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+    max_waiting=int(os.getenv("LLM_MAX_WAITING", "64")),
+    timeout=float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "10")),
+)
+
+#Identical questions asked at the same time are answered once
+answer_flights = SingleFlight()
+
+#Embeds Documents that have no embedding yet, in batches after startup and after each write-back
+embedding_backfill = EmbeddingBackfill(
+    neo4j_driver,
+    embeddings,
+    batch_size=int(os.getenv("EMBEDDING_BACKFILL_BATCH_SIZE", "256")),
+    #Newly embedded documents go straight into the mirror
+    on_embed=(vector_mirror.add,) if vector_mirror is not None else (),
+)
+
+#Write-back ingestion runs in the background, batched across requests
+ingest_queue = GraphIngestQueue(
+    flush=lambda documents: add_to_graph(
+        documents, graph, llm_transformer,
+        max_concurrency=int(os.getenv("INGEST_CONCURRENCY", "4")),
+        on_write=(gazetteer.add, embedding_backfill.wake),
+        limiter=llm_limiter,
+        driver=neo4j_driver,
+        on_new_facts=(answer_cache.invalidate, neighborhood_cache.invalidate),
+    ),
+    chunker=get_text_chunks_langchain,
+    max_size=int(os.getenv("INGEST_QUEUE_SIZE", "1000")),
+    batch_size=int(os.getenv("INGEST_BATCH_SIZE", "20")),
+    flush_interval=float(os.getenv("INGEST_FLUSH_SECONDS", "2")),
+)
+
+#Status of each startup step: pending, ok or the error it failed with
+readiness = {"graph": "pending", "vector_index": "pending", "gazetteer": "pending", "products": "pending", "neighborhood_cache": "pending"}
+if vector_mirror is not None:
+    readiness["vector_mirror"] = "pending"
+if os.getenv("STORE_DATASET"):
+    readiness["store_locator"] = "pending"
+
+async def startup_step(name: str, step):
+    try:
+        result = await step()
+    except Exception as e:
+        readiness[name] = f"error: {str(e)}"
+        print(f"Error during startup step {name}: {str(e)}")
+        return None
+    readiness[name] = "ok"
+    return result
+
+async def prewarm():
+    #Optionally pre-warm the neighborhood cache with the most connected entities
+    top_n = int(os.getenv("NEIGHBORHOOD_PREWARM", "0"))
+    if top_n:
+        loaded = await prewarm_neighborhoods(
+            neo4j_driver, neighborhood_cache, top_n, per_entity=int(os.getenv("GRAPH_ROWS_PER_ENTITY", "50"))
+        )
+        print(f"Pre-warmed {loaded} entity neighborhoods")
+
+def load_store_locator():
+    global store_locator
+    store_locator = StoreLocator.from_file(os.environ["STORE_DATASET"])
+    print(f"Loaded {len(store_locator)} stores")
+
+async def warm_up():
+    """Open the graph connection and vector index and load the local caches, all concurrently."""
+    global graph, vector_retriever
+    steps = [
+        startup_step("graph", lambda: asyncio.to_thread(connect_graph)),
+        startup_step("vector_index", lambda: asyncio.to_thread(build_vector_retriever, embeddings)),
+        #Build the local entity matcher from the ids already in the graph
+        startup_step("gazetteer", lambda: gazetteer.load(neo4j_driver)),
+        startup_step("products", lambda: product_gazetteer.load(neo4j_driver, PRODUCT_LABELS)),
+        startup_step("neighborhood_cache", prewarm),
+    ]
+    if vector_mirror is not None:
+        steps.append(startup_step("vector_mirror", lambda: vector_mirror.load(neo4j_driver)))
+    if os.getenv("STORE_DATASET"):
+        #Until it loads, and if it fails, every lookup goes to the Places API
+        steps.append(startup_step("store_locator", lambda: asyncio.to_thread(load_store_locator)))
+    graph, vector_retriever, *_ = await asyncio.gather(*steps)
+    if vector_retriever is not None and readiness.get("vector_mirror") == "ok":
+        #Serve vector search from memory, the Neo4j index stays the source of truth for the backfill
+        vector_retriever = vector_mirror
+    if graph is not None:
+        ingest_queue.start()
+    if vector_retriever is not None:
+        embedding_backfill.start()
 
 @app.get("/")
 def read_root():
-    return {"status": "ok", "message": "Made with Nestlé Chatbot API is running"}
+    return {
+        "status": "ok",
+        "message": "Made with Nestlé Chatbot API is running",
+        "ingest": ingest_queue.stats(),
+        "answer_cache": answer_cache.stats(),
+        "places_cache": places_client.stats(),
+        "embedding_cache": embeddings.stats(),
+        "embedding_backfill": embedding_backfill.stats(),
+        "context": context_packer.stats(),
+        "neighborhood_cache": neighborhood_cache.stats(),
+        "vector_mirror": vector_mirror.stats() if vector_mirror is not None else None,
+        "intent_router": intent_router.stats(),
+        "llm_limiter": llm_limiter.stats(),
+        "coalescing": answer_flights.stats(),
+    }
+
+#Cache and queue state sampled when /metrics is scraped
+registry.register(Gauges(
+    "chatbot_cache_hit_ratio", "Hit ratio of each in-process cache.", ["cache"],
+    lambda: {
+        ("answer",): answer_cache.stats()["hit_ratio"],
+        ("neighborhood",): neighborhood_cache.stats()["hit_ratio"],
+        ("places",): places_client.stats()["hit_ratio"],
+        ("embedding",): embeddings.stats()["hit_ratio"],
+    },
+))
+registry.register(Gauges(
+    "chatbot_cache_entries", "Entries held by each in-process cache.", ["cache"],
+    lambda: {
+        ("answer",): answer_cache.stats()["entries"],
+        ("neighborhood",): neighborhood_cache.stats()["entries"],
+        ("places",): places_client.stats()["entries"],
+    },
+))
+registry.register(Gauges(
+    "chatbot_intent_router_questions", "Questions the intent router decided locally or deferred to locate_chain.", ["decision"],
+    lambda: {("local",): intent_router.local, ("deferred",): intent_router.deferred},
+))
+registry.register(Gauges(
+    "chatbot_ingest_queue", "Write-back queue depth and lag of the oldest item in seconds.", ["measure"],
+    lambda: {("depth",): ingest_queue.stats()["queue_depth"], ("lag_seconds",): ingest_queue.stats()["queue_lag_seconds"]},
+))
+registry.register(Gauges(
+    "chatbot_prompt_tokens", "Average and maximum prompt tokens of packed RAG prompts.", ["measure"],
+    lambda: {("avg",): context_packer.stats()["avg_prompt_tokens"], ("max",): context_packer.stats()["max_prompt_tokens"]},
+))
+
+registry.register(Gauges(
+    "chatbot_llm_limiter", "LLM calls in flight and waiting, and requests shed since startup.", ["measure"],
+    lambda: {("in_use",): llm_limiter.in_use, ("waiting",): llm_limiter.waiting, ("shed",): llm_limiter.shed},
+))
+registry.register(Gauges(
+    "chatbot_coalesced_requests", "Requests that computed an answer or shared one already in flight.", ["role"],
+    lambda: {("leader",): answer_flights.leaders, ("follower",): answer_flights.followers},
+))
+
+@app.get("/metrics")
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+def ready():
+    #Ready once write-back and vector search are available, gazetteer and pre-warm failures only degrade
+    is_ready = readiness["graph"] == "ok" and readiness["vector_index"] == "ok"
+    return JSONResponse(
+        {"ready": is_ready, "components": readiness, "embedding_backfill": embedding_backfill.stats()},
+        status_code=200 if is_ready else 503,
+    )
+
+async def route_question(request: ChatRequest):
+    """Decide how to answer: returns (kind, value, question_vector) with kind cached, location or rag."""
+    #Clear-cut questions are routed locally first, location answers need no retrieval and are never cached
+    with span("intent_router"):
+        decision = intent_router.route(request.question)
+    if decision is not None and decision[0] and decision[1]:
+        return "location", decision[1], None
+
+    async def timed(stage, start):
+        #The coroutine is created inside the task, so a task cancelled before it runs leaves nothing unawaited
+        with span(stage):
+            return await start()
+
+    async def classify():
+        async with llm_limiter.slot(ROUTING):
+            return await locate_chain.ainvoke(request.question)
+
+    #When the router is unsure, retrieval overlaps the locate classifier and is dropped for location questions
+    retrieval = asyncio.create_task(timed(
+        "retrieval",
+        lambda: full_retriever(request.question, neo4j_driver, vector_retriever, entity_chain, context_packer,
+                               gazetteer, neighborhood_cache, llm_limiter),
+    ))
+    locate = asyncio.create_task(timed("locate", classify)) if decision is None else None
+    try:
+        with span("answer_cache"):
+            cached_answer, question_vector = await answer_cache.lookup(request.name, request.question)
+        if cached_answer is not None:
+            retrieval.cancel()
+            if locate is not None:
+                locate.cancel()
+            return "cached", cached_answer, question_vector
+        if decision is None:
+            locate_response = await locate
+            decision = (locate_response.question, locate_response.product)
+        is_location, products = decision
+        if is_location and products:
+            retrieval.cancel()
+            return "location", products, question_vector
+        return "rag", await retrieval, question_vector
+    except BaseException:
+        retrieval.cancel()
+        if locate is not None:
+            locate.cancel()
+        raise
+
+def finish_answer(request: ChatRequest, response: str, question_vector):
+    if response:
+        answer_cache.store(request.name, request.question, response, question_vector)
+    
+    #Hand the question to the background ingestion worker, repeated questions are skipped
+    ingest_queue.submit(request.question)
+
+def trace_requested(http_request: Request) -> bool:
+    #Clients opt in to per-request timings with `X-Trace: 1`
+    return http_request.headers.get("X-Trace", "") in ("1", "true")
+
+def flight_key(request: ChatRequest):
+    #Requests that would get the same answer: same bot name, question and location
+    return (request.name, normalize_question(request.question), request.lat, request.lng)
+
+def overloaded_response(e: Overloaded) -> JSONResponse:
+    return JSONResponse({"detail": str(e)}, status_code=503, headers={"Retry-After": str(e.retry_after)})
+
+async def answer(request: ChatRequest) -> str:
+    """Compute the answer to a chat request, shared by identical requests in flight at the same time."""
+    #New work is shed straight away once the LLM queue is full
+    llm_limiter.admit()
+    full_question = f'Your name is {request.name} answer this question: {request.question}'
+    kind, value, question_vector = await route_question(request)
+    ANSWERS.inc(path=kind)
+    if kind == "cached":
+        return value
+    if kind == "location":
+        if request.lat is not None and request.lng is not None:
+            response = await get_location(value, request.lat, request.lng, places_client, store_locator)
+        else:
+            response = "Please enable location services to find nearby locations."
+        return response + "\n\n" + get_amazon_links(value)
+    with span("generation"):
+        async with llm_limiter.slot(GENERATION):
+            response = await chain.ainvoke({"context": value, "question": full_question})
+    finish_answer(request, response, question_vector)
+    return response
 
 @app.post("/api/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request, http_response: Response):
+    trace = start_trace(trace_requested(http_request))
     try:
-        full_question = f'Your name is {request.name} answer this question: {request.question}'
-        locate_response = locate_chain.invoke(request.question)
-        if locate_response.question and locate_response.product:
-            if request.lat is not None and request.lng is not None:
-                response = get_location(locate_response.product, request.lat, request.lng)
-            else:
-                response = "Please enable location services to find nearby locations."
-            response += "\n\n" + get_amazon_links(locate_response.product)
-            return ChatResponse(answer=response)
-        response = chain.invoke(input= full_question)
-        print("LLM response:", response)
-        
-        documents = [request.question] if request.question.strip() else []
-        
-        # Add to graph only if documents is not empty
-        if documents:
-            documents = get_text_chunks_langchain(request.question)
-            add_to_graph(documents, graph, llm_transformer)
+        with span("request"):
+            response = await answer_flights.do(flight_key(request), lambda: answer(request))
         
         if not response:
             raise HTTPException(status_code=404, detail="No answer found")
         return ChatResponse(answer=response)
+    except Overloaded as e:
+        return overloaded_response(e)
     except Exception as e:
         print(f"Error processing request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if trace is not None:
+            http_response.headers["Server-Timing"] = server_timing(trace)
+
+async def stream_tokens(inputs: dict, tokens: asyncio.Queue):
+    """Stream the answer into `tokens` under a GENERATION slot, None marks the end.
+    The queue is unbounded so a slow client never keeps the slot past the end of the model stream."""
+    try:
+        async with llm_limiter.slot(GENERATION):
+            async for token in chain.astream(inputs):
+                tokens.put_nowait(token)
+    finally:
+        tokens.put_nowait(None)
+
+def sse(event: str, data: dict) -> str:
+    #Format one server-sent event, the payload is JSON so newlines survive
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, http_request: Request):
+    """Same answers as /api/chat, streamed as `token`, `location`, `done` and `error` events.
+    With `X-Trace: 1` the `done` event carries the stage timings."""
+    tracing = trace_requested(http_request)
+    try:
+        llm_limiter.admit()
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    async def events():
+        trace = start_trace(tracing)
+        started = time.perf_counter()
+        try:
+            full_question = f'Your name is {request.name} answer this question: {request.question}'
+            #Tokens are streamed per request, only routing and retrieval are shared
+            kind, value, question_vector = await answer_flights.do(("route",) + flight_key(request), lambda: route_question(request))
+            ANSWERS.inc(path=kind)
+            if kind == "cached":
+                yield sse("token", {"text": value})
+            elif kind == "location":
+                if request.lat is not None and request.lng is not None:
+                    yield sse("location", {"text": location_header(value)})
+                    #Send each product as soon as its lookup resolves
+                    lookups = [get_item_location(item, request.lat, request.lng, places_client, store_locator) for item in value]
+                    for lookup in asyncio.as_completed(lookups):
+                        yield sse("location", {"text": await lookup})
+                else:
+                    yield sse("location", {"text": "Please enable location services to find nearby locations."})
+                yield sse("location", {"text": "\n\n" + get_amazon_links(value)})
+            else:
+                response = ""
+                generation_started = time.perf_counter()
+                tokens = asyncio.Queue()
+                producer = asyncio.create_task(stream_tokens({"context": value, "question": full_question}, tokens))
+                try:
+                    while (token := await tokens.get()) is not None:
+                        if not response:
+                            STAGE_SECONDS.observe(time.perf_counter() - generation_started, stage="first_token")
+                        response += token
+                        yield sse("token", {"text": token})
+                    #Raises what the model stream raised
+                    await producer
+                finally:
+                    producer.cancel()
+                STAGE_SECONDS.observe(time.perf_counter() - generation_started, stage="generation")
+                finish_answer(request, response, question_vector)
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage="request")
+            if trace is not None:
+                yield sse("done", {"trace": {stage: round(elapsed * 1000, 1) for stage, elapsed in trace}})
+            else:
+                yield sse("done", {})
+        except Exception as e:
+            print(f"Error processing request: {str(e)}")
+            yield sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
     
 if __name__ == "__main__":
     import uvicorn
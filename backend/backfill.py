@@ -0,0 +1,101 @@
+import asyncio
+import time
+
+from neo4j import AsyncDriver
+
+MISSING_QUERY = """
+MATCH (d:Document)
+WHERE d.embedding IS NULL AND d.text IS NOT NULL
+RETURN elementId(d) AS id, d.text AS text, d {.*, embedding: Null, id: Null, text: Null} AS metadata
+LIMIT $limit
+"""
+SET_EMBEDDING_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document) WHERE elementId(d) = row.id
+CALL db.create.setNodeVectorProperty(d, 'embedding', row.embedding)
+"""
+
+
+class EmbeddingBackfill:
+    """Background job that embeds Document nodes still missing an embedding, one batch at a time.
+
+    Runs once at startup and again whenever `wake` is called, e.g. after new documents are written.
+    Each on_embed callback gets the (id, text, embedding, metadata) rows of a written batch.
+    """
+
+    def __init__(self, driver: AsyncDriver, embeddings, batch_size=256, retry_interval=60.0, on_embed=()):
+        self.driver = driver
+        self.on_embed = on_embed
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self.retry_interval = retry_interval
+        self.pending = asyncio.Event()
+        self.worker = None
+
+        #Metrics
+        self.embedded = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.running = False
+        self.last_batch_seconds = 0.0
+
+    def start(self):
+        if self.worker is None:
+            self.pending.set()
+            self.worker = asyncio.create_task(self._run())
+
+    def wake(self, ids=()):
+        #Accepts the touched ids so it can be passed to add_to_graph as an on_write callback
+        self.pending.set()
+
+    async def _batch(self) -> int:
+        records, _, _ = await self.driver.execute_query(MISSING_QUERY, {"limit": self.batch_size})
+        if not records:
+            return 0
+        started = time.monotonic()
+        vectors = await self.embeddings.aembed_documents([record["text"] for record in records])
+        rows = [{"id": record["id"], "embedding": vector} for record, vector in zip(records, vectors)]
+        await self.driver.execute_query(SET_EMBEDDING_QUERY, {"rows": rows})
+        for callback in self.on_embed:
+            callback([(record["id"], record["text"], vector, record["metadata"]) for record, vector in zip(records, vectors)])
+        self.embedded += len(rows)
+        self.batches += 1
+        self.last_batch_seconds = time.monotonic() - started
+        return len(rows)
+
+    async def _run(self):
+        while True:
+            await self.pending.wait()
+            self.pending.clear()
+            self.running = True
+            try:
+                while await self._batch() == self.batch_size:
+                    #Yield between batches so request handlers are never starved
+                    await asyncio.sleep(0)
+            except Exception as e:
+                self.failed_batches += 1
+                print(f"Error backfilling embeddings: {str(e)}")
+                self.running = False
+                await asyncio.sleep(self.retry_interval)
+                self.pending.set()
+                continue
+            self.running = False
+
+    async def stop(self):
+        if self.worker is None:
+            return
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "embedded": self.embedded,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+            "last_batch_seconds": round(self.last_batch_seconds, 3),
+        }
@@ -0,0 +1,257 @@
+import re
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(text: str) -> str:
+    #Lowercase, drop punctuation and collapse whitespace
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class TTLCache:
+    """LRU cache with per-entry expiry and an optional memory bound."""
+
+    def __init__(self, max_entries=1024, ttl=3600.0, max_bytes=None, sizeof=None, on_remove=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        #Called with (key, value) whenever an entry leaves the cache, for indexes kept alongside it
+        self.on_remove = on_remove
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return self.get(key, count=False) is not None
+
+    def get(self, key, default=None, count=True):
+        entry = self.entries.get(key)
+        if entry is not None and entry[1] < time.monotonic():
+            self.pop(key)
+            entry = None
+        if entry is None:
+            if count:
+                self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        if count:
+            self.hits += 1
+        return entry[0]
+
+    def set(self, key, value):
+        self.pop(key)
+        size = self.sizeof(value)
+        self.entries[key] = (value, time.monotonic() + self.ttl, size)
+        self.bytes += size
+        #Evict least recently used entries until both bounds hold
+        while self.entries and (
+            len(self.entries) > self.max_entries
+            or (self.max_bytes is not None and self.bytes > self.max_bytes)
+        ):
+            evicted_key, (evicted, _, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+            if self.on_remove is not None:
+                self.on_remove(evicted_key, evicted)
+
+    def pop(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.bytes -= entry[2]
+        if self.on_remove is not None:
+            self.on_remove(key, entry[0])
+        return entry[0]
+
+    def clear(self):
+        for key in list(self.entries):
+            self.pop(key)
+        self.bytes = 0
+
+    def items(self):
+        """Live (key, value) pairs, expired entries are dropped on the way."""
+        now = time.monotonic()
+        expired = [key for key, entry in self.entries.items() if entry[1] < now]
+        for key in expired:
+            self.pop(key)
+        return [(key, entry[0]) for key, entry in self.entries.items()]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class SemanticCache:
+    """Answer cache matched on the normalized question, then on embedding similarity.
+
+    Question vectors live in one preallocated float32 matrix, each entry owns a row that is
+    written on store and zeroed when the entry leaves, so a lookup is a single matrix product.
+    """
+
+    def __init__(self, embeddings, threshold=0.95, max_entries=2048, ttl=3600.0, max_bytes=64 * 1024 * 1024):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.cache = TTLCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: len(entry["answer"]) + len(entry["question"]) + self.matrix[entry["row"]].nbytes,
+            on_remove=self._free_row,
+        )
+        #One spare row, a new entry takes its row before the cache evicts to make room
+        self.capacity = max_entries + 1
+        self.matrix = None
+        self.row_keys = [None] * self.capacity
+        #Lowest rows are reused first so the searched prefix stays short
+        self.free_rows = list(range(self.capacity - 1, -1, -1))
+        self.used_rows = 0
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    async def lookup(self, namespace: str, question: str):
+        """Return (answer or None, question embedding) so a miss can reuse the embedding on store."""
+        key = (namespace, normalize_question(question))
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.exact_hits += 1
+            return entry["answer"], self.matrix[entry["row"]].copy()
+
+        try:
+            vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        except Exception as e:
+            #A cache failure should never fail the request
+            print(f"Error embedding question for answer cache: {str(e)}")
+            self.misses += 1
+            return None, None
+        vector /= np.linalg.norm(vector) or 1.0
+        if self.matrix is not None and self.matrix.shape[1] == vector.shape[0]:
+            #Free rows are zero and never reach the threshold
+            scores = self.matrix[:self.used_rows] @ vector
+            for row in sorted(np.flatnonzero(scores >= self.threshold), key=lambda row: -scores[row]):
+                candidate = self.row_keys[row]
+                if candidate is None or candidate[0] != namespace:
+                    continue
+                #Also refreshes recency, and drops the entry if it has expired
+                entry = self.cache.get(candidate, count=False)
+                if entry is not None:
+                    self.semantic_hits += 1
+                    return entry["answer"], vector
+        self.misses += 1
+        return None, vector
+
+    def store(self, namespace: str, question: str, answer: str, vector):
+        if vector is None:
+            return
+        key = (namespace, normalize_question(question))
+        vector = np.asarray(vector, dtype=np.float32)
+        if self.matrix is None:
+            self.matrix = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        elif self.matrix.shape[1] != vector.shape[0]:
+            return
+        #Release the row of a previous answer to the same question before taking a new one
+        self.cache.pop(key)
+        row = self.free_rows.pop()
+        self.matrix[row] = vector
+        self.row_keys[row] = key
+        self.used_rows = max(self.used_rows, row + 1)
+        self.cache.set(key, {"question": key[1], "answer": answer, "row": row})
+
+    def _free_row(self, key, entry):
+        row = entry["row"]
+        self.matrix[row] = 0.0
+        self.row_keys[row] = None
+        self.free_rows.append(row)
+
+    def invalidate(self, terms, sources=()):
+        """Drop cached answers whose question mentions any of the given entity ids.
+
+        Questions that are themselves among `sources`, the texts the write came from, are kept:
+        a write-back only restates the question that was just answered."""
+        terms = [normalize_question(str(term)) for term in terms]
+        terms = [term for term in terms if term]
+        sources = [normalize_question(source) for source in sources]
+        sources = [source for source in sources if source]
+        removed = 0
+        for key, entry in self.cache.items():
+            padded = f" {entry['question']} "
+            #Long questions are written back in chunks, each chunk is part of the question
+            if any(source in entry["question"] for source in sources):
+                continue
+            if any(f" {term} " in padded for term in terms):
+                self.cache.pop(key)
+                removed += 1
+        return removed
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        lookups = self.exact_hits + self.semantic_hits + self.misses
+        stats = self.cache.stats()
+        stats.update({
+            "hits": self.exact_hits + self.semantic_hits,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.exact_hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+        })
+        return stats
+
+
+class NeighborhoodCache:
+    """Resolved entity neighborhoods keyed by fulltext query, dropped when a write adds facts about them."""
+
+    def __init__(self, max_entries=4096, ttl=3600.0, max_bytes=32 * 1024 * 1024):
+        self.cache = TTLCache(
+            max_entries=max_entries,
+            ttl=ttl,
+            max_bytes=max_bytes,
+            sizeof=lambda entry: sum(len(o) for o in entry["outputs"]) + sum(len(i) for i in entry["ids"]),
+        )
+        self.invalidations = 0
+
+    def get(self, query: str):
+        entry = self.cache.get(query)
+        return None if entry is None else entry["outputs"]
+
+    def set(self, query: str, entity: str, outputs: list[str], ids):
+        self.cache.set(query, {"words": set(normalize_question(entity).split()), "outputs": outputs, "ids": set(ids)})
+
+    def invalidate(self, ids, sources=()):
+        """Drop neighborhoods that contain one of the written ids, or whose entity words all appear in one.
+        Accepts the source texts so it shares the answer cache's callback signature."""
+        ids = {str(i) for i in ids}
+        id_words = [set(normalize_question(i).split()) for i in ids]
+        removed = 0
+        for key, entry in self.cache.items():
+            #A new node can also start matching the fulltext query of an entry
+            if entry["ids"] & ids or any(entry["words"] and entry["words"] <= words for words in id_words):
+                self.cache.pop(key)
+                removed += 1
+        self.invalidations += removed
+        return removed
+
+    def clear(self):
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["invalidations"] = self.invalidations
+        return stats
@@ -0,0 +1,18 @@
+import os
+
+from langchain_openai import AzureChatOpenAI
+
+
+def build_chat_model(**overrides):
+    """Azure chat model shared by the backend and the graph-prep pipeline. The langchain_openai class
+    understands stream_usage, the older langchain.chat_models one forwards it to the API and every call fails."""
+    return AzureChatOpenAI(**{
+        "deployment_name": os.getenv("AZURE_OPENAI_DEPLOYMENT"),
+        "openai_api_key": os.getenv("AZURE_OPENAI_API_KEY"),
+        "azure_endpoint": os.getenv("AZURE_OPENAI_ENDPOINT"),
+        "openai_api_version": os.getenv("AZURE_OPENAI_API_VERSION"),
+        "temperature": 0,
+        #Report token usage on streamed answers too
+        "stream_usage": True,
+        **overrides,
+    })
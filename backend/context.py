@@ -0,0 +1,158 @@
+import math
+import re
+from collections import Counter
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    #Not installed, or offline on first use when the encoding file is not cached yet
+    ENCODING = None
+
+WORD = re.compile(r"\w+")
+#Words that match everything and say nothing about relevance
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "in", "is",
+    "it", "me", "my", "of", "on", "or", "the", "to", "what", "where", "which", "who", "with", "you", "your",
+}
+
+
+def count_tokens(text: str) -> int:
+    if ENCODING is None:
+        #Roughly four characters per token for English text
+        return len(text) // 4
+    return len(ENCODING.encode(text))
+
+
+def terms(text: str) -> list[str]:
+    return [w for w in WORD.findall(text.lower()) if w not in STOPWORDS]
+
+
+def normalize_triple(triple: str) -> str:
+    return " ".join(triple.lower().split())
+
+
+def shingle_set(text: str, size=3) -> set:
+    words = WORD.findall(text.lower())
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def bm25_scores(question: str, texts: list[str], k1=1.2, b=0.75) -> list[float]:
+    """BM25 score of each text for the question, with document frequencies taken from the candidates."""
+    query = set(terms(question))
+    docs = [Counter(terms(text)) for text in texts]
+    if not query or not docs:
+        return [0.0] * len(texts)
+    avg_len = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+    df = Counter(term for d in docs for term in query if term in d)
+    scores = []
+    for d in docs:
+        length = sum(d.values())
+        score = 0.0
+        for term in query:
+            tf = d.get(term, 0)
+            if tf:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+class ContextPacker:
+    """Dedupe, rank and pack graph triples and vector chunks into a token budget.
+
+    Triples get `graph_share` of the budget first and chunks the rest, whatever one side
+    leaves unused goes to the other. Every chunk keeps its source URL for citations.
+    """
+
+    def __init__(self, budget=2000, graph_share=0.35, overlap=0.8, template=""):
+        self.budget = budget
+        self.graph_share = graph_share
+        self.overlap = overlap
+        self.template_tokens = count_tokens(template)
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.max_prompt_tokens = 0
+        self.dropped = 0
+
+    def dedupe_triples(self, triples: list[str]) -> list[str]:
+        seen = set()
+        unique = []
+        for triple in triples:
+            key = normalize_triple(triple)
+            if key and key not in seen:
+                seen.add(key)
+                unique.append(triple)
+        return unique
+
+    def dedupe_chunks(self, documents) -> list:
+        #Adjacent chunks share their overlap window, drop one that is mostly contained in a kept chunk
+        kept, kept_shingles = [], []
+        for doc in documents:
+            shingles = shingle_set(doc.page_content)
+            if any(len(shingles & other) >= self.overlap * min(len(shingles), len(other)) for other in kept_shingles):
+                continue
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept
+
+    def fill(self, ranked, budget):
+        packed, used = [], 0
+        for text, tokens in ranked:
+            if used + tokens <= budget:
+                packed.append(text)
+                used += tokens
+        return packed, used
+
+    def pack(self, question: str, triples: list[str], documents) -> tuple[str, dict]:
+        """Return the context for the prompt and a report of what went into it."""
+        unique_triples = self.dedupe_triples(triples)
+        unique_docs = self.dedupe_chunks(documents)
+        self.dropped += len(triples) - len(unique_triples) + len(documents) - len(unique_docs)
+
+        chunk_texts = []
+        for doc in unique_docs:
+            #Only web pages are cited, a loader's `source` may also be a local file path
+            url = str(doc.metadata.get("url") or doc.metadata.get("source") or "")
+            cited = url.startswith(("http://", "https://"))
+            chunk_texts.append(f"{doc.page_content.strip()}\n[Source: {url}]" if cited else doc.page_content.strip())
+
+        #Stable sort keeps retrieval order between equal scores
+        def ranked(texts):
+            scores = bm25_scores(question, texts)
+            order = sorted(range(len(texts)), key=lambda i: -scores[i])
+            return [(texts[i], count_tokens(texts[i]) + 1) for i in order]
+
+        ranked_triples = ranked(unique_triples)
+        ranked_chunks = ranked(chunk_texts)
+        graph_budget = int(self.budget * self.graph_share) if ranked_chunks else self.budget
+        graph_items, graph_used = self.fill(ranked_triples, graph_budget)
+        chunk_items, chunk_used = self.fill(ranked_chunks, self.budget - graph_used)
+        if chunk_used < self.budget - graph_used:
+            packed = set(graph_items)
+            extra, extra_used = self.fill([t for t in ranked_triples if t[0] not in packed], self.budget - graph_used - chunk_used)
+            graph_items += extra
+            graph_used += extra_used
+
+        context = "Graph data:\n" + "\n".join(graph_items) + "\n\nVector data:\n" + "\n\n".join(chunk_items)
+        context_tokens = count_tokens(context)
+        prompt_tokens = context_tokens + count_tokens(question) + self.template_tokens
+        self.requests += 1
+        self.prompt_tokens += prompt_tokens
+        self.max_prompt_tokens = max(self.max_prompt_tokens, prompt_tokens)
+        report = {
+            "prompt_tokens": prompt_tokens,
+            "context_tokens": context_tokens,
+            "triples": f"{len(graph_items)}/{len(triples)}",
+            "chunks": f"{len(chunk_items)}/{len(documents)}",
+        }
+        return context, report
+
+    def stats(self) -> dict:
+        return {
+            "budget": self.budget,
+            "requests": self.requests,
+            "avg_prompt_tokens": self.prompt_tokens / self.requests if self.requests else 0.0,
+            "max_prompt_tokens": self.max_prompt_tokens,
+            "duplicates_dropped": self.dropped,
+        }
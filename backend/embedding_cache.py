@@ -0,0 +1,207 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+class DiskEmbeddingStore:
+    """Append-only on-disk vectors: a memory-mapped float32 matrix plus a key -> row index file.
+
+    Several processes may share a directory, appends hold an exclusive flock on it and keys
+    another process wrote are read from the index on a miss.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.vectors_path = os.path.join(path, "vectors.f32")
+        self.index_path = os.path.join(path, "index.tsv")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.lock_path = os.path.join(path, ".lock")
+        self.dim = None
+        self.rows = {}
+        #Bytes of the index already read, always at a line boundary
+        self.index_offset = 0
+        self.matrix = None
+        self.lock = threading.Lock()
+        self._refresh()
+
+    @contextmanager
+    def _exclusive(self):
+        with open(self.lock_path, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Read index lines appended since the last call, by this process or another one."""
+        if self.dim is None and os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self.index_path) or os.path.getsize(self.index_path) <= self.index_offset:
+            return
+        #Only whole rows count, a partial tail is a torn write and is truncated by the next writer
+        stored = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        with open(self.index_path, "rb") as f:
+            f.seek(self.index_offset)
+            tail = f.read()
+        #A line without its newline is torn or still being written
+        complete = tail[:tail.rfind(b"\n") + 1]
+        self.index_offset += len(complete)
+        for line in complete.decode("utf-8").splitlines():
+            key, _, row = line.partition("\t")
+            if row and int(row) < stored:
+                self.rows[key] = int(row)
+
+    def _map(self):
+        count = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(count, self.dim)) if count else None
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                self._refresh()
+                row = self.rows.get(key)
+            if row is None:
+                return None
+            if self.matrix is None or row >= self.matrix.shape[0]:
+                self._map()
+            return np.array(self.matrix[row])
+
+    def put_many(self, items):
+        items = [(key, np.asarray(vector, dtype=np.float32)) for key, vector in items if key not in self.rows]
+        if not items:
+            return
+        with self.lock, self._exclusive():
+            #Another process may have written some of these keys, or the dimension, since the last read
+            self._refresh()
+            items = [(key, vector) for key, vector in items if key not in self.rows]
+            if not items:
+                return
+            if self.dim is None:
+                self.dim = int(items[0][1].shape[0])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim}, f)
+            row_bytes = 4 * self.dim
+            #Vectors are written before the index so a crash never leaves an index line without data
+            with open(self.vectors_path, "ab") as f:
+                #Drop a partial row left by a crashed writer, it would shift every row appended after it
+                start = f.seek(0, os.SEEK_END) // row_bytes
+                f.truncate(start * row_bytes)
+                f.write(b"".join(vector.tobytes() for _, vector in items))
+            lines = "".join(f"{key}\t{start + offset}\n" for offset, (key, _) in enumerate(items)).encode("utf-8")
+            with open(self.index_path, "ab") as f:
+                #Likewise drop a torn last line, everything before index_offset has been read
+                f.truncate(self.index_offset)
+                f.write(lines)
+            self.index_offset += len(lines)
+            for offset, (key, _) in enumerate(items):
+                self.rows[key] = start + offset
+
+    def __len__(self):
+        return len(self.rows)
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-hash keyed embedding cache with an in-memory LRU tier and an optional disk tier."""
+
+    def __init__(self, embeddings: Embeddings, cache_dir=None, namespace="", max_memory_entries=10000, batch_size=256):
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.max_memory_entries = max_memory_entries
+        self.batch_size = batch_size
+        self.memory = OrderedDict()
+        self.disk = DiskEmbeddingStore(cache_dir) if cache_dir else None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.api_calls = 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode("utf-8")).hexdigest()
+
+    def _lookup(self, key: str):
+        with self.lock:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                return vector
+        if self.disk is not None:
+            vector = self.disk.get(key)
+            if vector is not None:
+                self._remember(key, vector)
+            return vector
+        return None
+
+    def _remember(self, key: str, vector):
+        with self.lock:
+            self.memory[key] = vector
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_memory_entries:
+                self.memory.popitem(last=False)
+
+    def _split(self, texts):
+        #Resolve what is cached and collect the distinct texts that still need embedding
+        keys = [self.key(text) for text in texts]
+        vectors = [self._lookup(key) for key in keys]
+        missing = {}
+        for text, key, vector in zip(texts, keys, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        self.hits += sum(vector is not None for vector in vectors)
+        self.misses += len(missing)
+        return keys, vectors, missing
+
+    def _store(self, keys, vectors, missing, embedded):
+        fresh = dict(zip(missing.keys(), (np.asarray(v, dtype=np.float32) for v in embedded)))
+        for key, vector in fresh.items():
+            self._remember(key, vector)
+        if self.disk is not None:
+            self.disk.put_many(fresh.items())
+        return [(vector if vector is not None else fresh[key]).tolist() for key, vector in zip(keys, vectors)]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = self._split(texts)
+        embedded = []
+        pending = list(missing.values())
+        #All misses go out in as few API calls as the batch size allows
+        for i in range(0, len(pending), self.batch_size):
+            self.api_calls += 1
+            embedded.extend(self.embeddings.embed_documents(pending[i:i + self.batch_size]))
+        return self._store(keys, vectors, missing, embedded)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys, vectors, missing = await asyncio.to_thread(self._split, texts)
+        embedded = []
+        pending = list(missing.values())
+        for i in range(0, len(pending), self.batch_size):
+            self.api_calls += 1
+            embedded.extend(await self.embeddings.aembed_documents(pending[i:i + self.batch_size]))
+        return await asyncio.to_thread(self._store, keys, vectors, missing, embedded)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "memory_entries": len(self.memory),
+            "disk_entries": len(self.disk) if self.disk is not None else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "api_calls": self.api_calls,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
@@ -0,0 +1,386 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, List, Optional
+
+import httpx
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+#Services that can be replaced, FAKE_SERVICES takes a comma separated subset or `all`
+SERVICES = ("llm", "embeddings", "neo4j", "places")
+
+WORD = re.compile(r"\w+")
+
+#Small catalogue the fake graph, LLM and Places API agree on
+PRODUCTS = [
+    "KitKat", "Nesquik", "Smarties", "Aero", "Coffee-mate", "Nescafe", "Quality Street",
+    "Boost", "Carnation", "Maggi", "Haagen-Dazs", "Perrier", "Turtles", "Coffee Crisp",
+]
+INGREDIENTS = ["milk chocolate", "cocoa", "sugar", "wheat flour", "vanilla", "caramel", "coffee", "oats"]
+FLAVOURS = ["original", "dark", "white", "mint", "strawberry", "hazelnut", "salted caramel"]
+
+
+def enabled_services(value: str) -> set[str]:
+    services = {service.strip().lower() for service in value.split(",") if service.strip()}
+    if "all" in services:
+        return set(SERVICES)
+    unknown = services - set(SERVICES)
+    if unknown:
+        raise ValueError(f"Unknown FAKE_SERVICES {sorted(unknown)}, expected some of {SERVICES} or all")
+    return services
+
+
+def stable_hash(text: str) -> int:
+    #Python's hash() is salted per process, benchmarks need the same numbers on every run
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class Latency:
+    """Injected delay of `ms` milliseconds, +- `jitter` as a fraction, derived from a key so reruns match."""
+
+    def __init__(self, ms=0.0, jitter=0.0):
+        self.ms = ms
+        self.jitter = jitter
+
+    @classmethod
+    def from_env(cls, service: str, default_ms=0.0):
+        return cls(
+            ms=float(os.getenv(f"FAKE_{service.upper()}_LATENCY_MS", str(default_ms))),
+            jitter=float(os.getenv("FAKE_LATENCY_JITTER", "0.2")),
+        )
+
+    def seconds(self, key="") -> float:
+        spread = (stable_hash(key) % 2001) / 1000 - 1 if self.jitter else 0.0
+        return max(0.0, self.ms * (1 + self.jitter * spread) / 1000)
+
+    async def wait(self, key=""):
+        delay = self.seconds(key)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def block(self, key=""):
+        delay = self.seconds(key)
+        if delay:
+            time.sleep(delay)
+
+
+def find_products(text: str, products=PRODUCTS) -> list[str]:
+    lowered = text.lower()
+    return [product for product in products if product.lower() in lowered]
+
+
+class FakeGraphStore:
+    """In-memory graph of entities, relationships and Document chunks shared by the Neo4j fakes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}
+        self.relations = set()
+        self.documents = {}
+
+    @classmethod
+    def seeded(cls):
+        store = cls()
+        for i, product in enumerate(PRODUCTS):
+            ingredients = [INGREDIENTS[(i + j) % len(INGREDIENTS)] for j in range(3)]
+            flavours = [FLAVOURS[(i + j) % len(FLAVOURS)] for j in range(2)]
+            store.add_entity(product, "Product")
+            store.add_entity("Nestlé", "Brand")
+            store.add_relation(product, "MADE_BY", "Nestlé")
+            for ingredient in ingredients:
+                store.add_entity(ingredient, "Ingredient")
+                store.add_relation(product, "CONTAINS", ingredient)
+            for flavour in flavours:
+                store.add_entity(flavour, "Flavour")
+                store.add_relation(product, "HAS_FLAVOUR", flavour)
+            url = f"https://www.madewithnestle.ca/{product.lower().replace(' ', '-')}"
+            #Written without embeddings, the backfill fills them in like on a fresh database
+            store.add_document(f"{product} is made with {', '.join(ingredients)}.", {"url": url})
+            store.add_document(f"{product} comes in {' and '.join(flavours)} flavours.", {"url": url})
+            store.add_document(f"Try {product} in a recipe with {ingredients[0]} for dessert.", {"url": url + "/recipes"})
+        return store
+
+    def add_entity(self, entity_id: str, label: str):
+        self.labels.setdefault(entity_id, {"__Entity__"}).add(label)
+
+    def add_relation(self, head: str, relation: str, tail: str):
+        self.relations.add((head, relation, tail))
+
+    def add_document(self, text: str, metadata=None) -> str:
+        doc_id = f"doc:{hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]}"
+        if doc_id not in self.documents:
+            self.documents[doc_id] = {"text": text, "embedding": None, "metadata": metadata or {}}
+        return doc_id
+
+    def degree(self, entity_id: str) -> int:
+        return sum(entity_id in (head, tail) for head, _, tail in self.relations)
+
+
+_store = None
+
+
+def shared_store() -> FakeGraphStore:
+    global _store
+    if _store is None:
+        _store = FakeGraphStore.seeded()
+    return _store
+
+
+class FakeNeo4jDriver:
+    """Answers the Cypher queries the backend sends through the async driver from a FakeGraphStore.
+
+    Queries are recognised by a distinctive fragment, an unknown query raises so a new one
+    is noticed rather than silently answered with nothing.
+    """
+
+    def __init__(self, store: FakeGraphStore = None, latency: Latency = None):
+        self.store = store or shared_store()
+        self.latency = latency or Latency()
+        self.queries = 0
+
+    async def execute_query(self, query: str, parameters=None, routing_=None, **kwargs):
+        parameters = dict(parameters or {}, **{k: v for k, v in kwargs.items() if not k.endswith("_")})
+        self.queries += 1
+        await self.latency.wait(query + json.dumps(parameters, sort_keys=True, default=str))
+        with self.store.lock:
+            records = self._answer(query, parameters)
+        return records, None, None
+
+    def _answer(self, query: str, parameters: dict) -> list[dict]:
+        store = self.store
+        if "AS existing" in query:
+            return [{"source": f["source"], "target": f["target"]} for f in parameters["facts"]
+                    if (f["source"], f["type"], f["target"]) not in store.relations]
+        if "fulltext_entity_id" in query:
+            return self._neighborhoods(parameters["queries"], parameters["per_entity"])
+        if "ORDER BY COUNT" in query:
+            ranked = sorted(store.labels, key=lambda entity_id: -store.degree(entity_id))
+            return [{"id": entity_id} for entity_id in ranked[:parameters["limit"]]]
+        if "RETURN e.id AS id" in query:
+            labels = parameters.get("labels")
+            return [{"id": entity_id} for entity_id, entity_labels in store.labels.items()
+                    if not labels or entity_labels & set(labels)]
+        if "d.embedding IS NULL" in query:
+            missing = [(doc_id, doc) for doc_id, doc in store.documents.items() if doc["embedding"] is None]
+            return [{"id": doc_id, "text": doc["text"], "metadata": dict(doc["metadata"])}
+                    for doc_id, doc in missing[:parameters["limit"]]]
+        if "setNodeVectorProperty" in query:
+            for row in parameters["rows"]:
+                if row["id"] in store.documents:
+                    store.documents[row["id"]]["embedding"] = list(row["embedding"])
+            return []
+        if "d.embedding AS embedding" in query:
+            return [{"id": doc_id, "text": doc["text"], "embedding": doc["embedding"], "metadata": dict(doc["metadata"])}
+                    for doc_id, doc in store.documents.items() if doc["embedding"] is not None]
+        raise ValueError(f"FakeNeo4jDriver does not know this query: {query.strip()[:80]}")
+
+    def _neighborhoods(self, queries, per_entity) -> list[dict]:
+        records = []
+        for q in queries:
+            #Fulltext terms look like `word~2 AND word~2`, match entities containing every word
+            terms = [term.split("~")[0].lower() for term in q["query"].split(" AND ")]
+            nodes = [entity_id for entity_id in self.store.labels if all(term in entity_id.lower() for term in terms)][:7]
+            rows = {}
+            for head, relation, tail in sorted(self.store.relations):
+                if head in nodes or tail in nodes:
+                    source, neighbor = (head, tail) if head in nodes else (tail, head)
+                    rows.setdefault(f"{head} - {relation} -> {tail}", [source, neighbor])
+            for output, ids in list(rows.items())[:per_entity]:
+                records.append({"rank": q["rank"], "output": output, "ids": ids})
+        return records
+
+    async def close(self):
+        pass
+
+
+class FakeNeo4jGraph:
+    """Stand-in for Neo4jGraph's write-back: graph documents land in the FakeGraphStore."""
+
+    def __init__(self, store: FakeGraphStore = None, latency: Latency = None):
+        self.store = store or shared_store()
+        self.latency = latency or Latency()
+
+    def add_graph_documents(self, graph_documents, baseEntityLabel=False, include_source=False):
+        #Called from a worker thread like the real one, so it blocks
+        self.latency.block(str(len(graph_documents)))
+        with self.store.lock:
+            for graph_doc in graph_documents:
+                for node in graph_doc.nodes:
+                    self.store.add_entity(node.id, node.type)
+                for rel in graph_doc.relationships:
+                    #Relationship types are normalized like Neo4jGraph does
+                    self.store.add_relation(rel.source.id, rel.type.replace(" ", "_").upper(), rel.target.id)
+                if include_source and graph_doc.source is not None:
+                    self.store.add_document(graph_doc.source.page_content, graph_doc.source.metadata)
+
+
+class FakeVectorRetriever:
+    """Stand-in for the Neo4jVector retriever: cosine search over the embedded documents of the store."""
+
+    def __init__(self, embeddings, store: FakeGraphStore = None, latency: Latency = None, k=8):
+        self.embeddings = embeddings
+        self.store = store or shared_store()
+        self.latency = latency or Latency()
+        self.k = k
+
+    async def ainvoke(self, question: str) -> list[Document]:
+        vector = np.asarray(await self.embeddings.aembed_query(question), dtype=np.float32)
+        await self.latency.wait(question)
+        with self.store.lock:
+            rows = [doc for doc in self.store.documents.values() if doc["embedding"] is not None]
+        if not rows:
+            return []
+        scores = np.asarray([doc["embedding"] for doc in rows], dtype=np.float32) @ vector
+        top = np.argsort(-scores)[:self.k]
+        return [Document(page_content=f"\ntext: {rows[i]['text']}", metadata=dict(rows[i]["metadata"])) for i in top]
+
+
+class FakeEmbeddings(Embeddings):
+    """Hashed bag-of-words vectors: deterministic, and texts sharing words land close together."""
+
+    def __init__(self, dim=256, latency: Latency = None):
+        self.dim = dim
+        self.latency = latency or Latency()
+        self.calls = 0
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in WORD.findall(text.lower()):
+            h = stable_hash(word)
+            vector[h % self.dim] += 1.0 if (h // self.dim) % 2 else -1.0
+        norm = np.linalg.norm(vector)
+        if not norm:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.latency.block("".join(texts))
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        await self.latency.wait("".join(texts))
+        return [self._vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic stand-in for AzureChatOpenAI that recognises the backend's prompts.
+
+    Answers the locate and entity parsers with valid JSON, the graph transformer with a JSON list
+    of relations, and anything else with a plain answer built from the prompt. `latency_ms` is the
+    time to the first token and `token_ms` the time per further streamed token.
+    """
+
+    latency_ms: float = 0.0
+    token_ms: float = 0.0
+    jitter: float = 0.0
+    answer_words: int = 60
+    products: List[str] = PRODUCTS
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-azure-chat"
+
+    def _respond(self, messages: List[BaseMessage]) -> str:
+        prompt = "\n".join(str(message.content) for message in messages)
+        last = str(messages[-1].content)
+        if '"head_type"' in prompt:
+            #Graph transformer in prompt mode, link what the text after its examples mentions to Nestlé
+            text = last.rpartition("\nText: ")[2]
+            entities = find_products(text, self.products) or re.findall(r"\b[A-Z][a-z]+\b", text)[:3]
+            return json.dumps([
+                {"head": entity, "head_type": "Product", "relation": "MADE_BY", "tail": "Nestlé", "tail_type": "Brand"}
+                for entity in dict.fromkeys(entities)
+            ])
+        if "looking for a location:" in last:
+            question = last.partition("looking for a location:")[2].lower()
+            is_location = bool(re.search(r"\bwhere\b|\bnear\b|\bnearby\b|\bbuy\b|\bstores?\b", question))
+            return json.dumps({"question": is_location, "product": find_products(question, self.products)})
+        if "extract information from the following" in last:
+            question = last.partition("input:")[2]
+            return json.dumps({"link": find_products(question, self.products) or WORD.findall(question)[-2:]})
+        words = WORD.findall(last) or ["Nestlé"]
+        answer = " ".join(words[(i * 7) % len(words)] for i in range(self.answer_words))
+        source = re.search(r"\[Source: ([^\]]+)\]", prompt)
+        return f"Here is what I found: {answer}." + (f" Source: {source.group(1)}" if source else "")
+
+    def _usage(self, messages: List[BaseMessage], text: str) -> dict:
+        #Roughly 4 tokens per 3 words, enough for the token metrics to move
+        input_tokens = sum(len(str(message.content).split()) for message in messages) * 4 // 3
+        output_tokens = len(text.split()) * 4 // 3
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+    def _delays(self, messages: List[BaseMessage], text: str) -> tuple[float, float]:
+        key = "".join(str(message.content) for message in messages)
+        first = Latency(self.latency_ms, self.jitter).seconds(key)
+        return first, self.token_ms * max(len(text.split()) - 1, 0) / 1000
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._respond(messages)
+        time.sleep(sum(self._delays(messages, text)))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text = self._respond(messages)
+        await asyncio.sleep(sum(self._delays(messages, text)))
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        text = self._respond(messages)
+        first, _ = self._delays(messages, text)
+        await asyncio.sleep(first)
+        tokens = re.findall(r"\S+\s*", text)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_ms / 1000)
+            #Usage goes on the last chunk, like Azure with stream_usage
+            usage = self._usage(messages, text) if i == len(tokens) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+
+def places_transport(latency: Latency = None) -> httpx.MockTransport:
+    """httpx transport answering Places nearby searches with a few deterministic stores around the location."""
+    latency = latency or Latency()
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        keyword = request.url.params.get("keyword", "")
+        location = request.url.params.get("location", "0,0")
+        await latency.wait(keyword + location)
+        lat, lng = (float(value) for value in location.split(","))
+        results = []
+        for i in range(5):
+            h = stable_hash(f"{keyword}|{location}|{i}")
+            results.append({
+                "name": f"{keyword.title()} Store {i + 1}",
+                "vicinity": f"{100 + h % 900} Main Street",
+                "geometry": {"location": {
+                    "lat": lat + ((h % 2001) - 1000) / 1e5,
+                    "lng": lng + (((h >> 11) % 2001) - 1000) / 1e5,
+                }},
+                "opening_hours": {"open_now": bool(h % 3)},
+            })
+        return httpx.Response(200, json={"status": "OK", "results": results})
+
+    return httpx.MockTransport(handler)
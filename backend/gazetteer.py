@@ -0,0 +1,254 @@
+import re
+from collections import defaultdict, deque
+
+from neo4j import AsyncDriver, RoutingControl
+
+
+#Everyday words are never typo-corrected, in a question or onto an entity id, and an entity id made of
+#one of them alone is weak evidence: "how long does it take" is not about `Cake`
+COMMON_WORDS = frozenset("""
+about above after again against also always another answer anything around away back bake bar bars because been
+before being below best better between both brand bring buy cake call came can cannot candy care cheap close come
+could cream cups daily days dessert did different does doing done down drink drinks each easy either else enough even
+ever every fast feel few find fine first food free fresh from full gave give going good great group half hand have
+having help here high hold home hour house idea into just keep kind know large last late left less light like line
+list little live local long look made make many mean meal might milk mind more most much must name near need never new
+next nice night none note nothing now number often once only open other over part people piece place plan plus point
+price quick quite rather read real recipe rice right said same says seem serve shop should show side since size small
+some something sound start still store stores such sugar sure take tell than thank that their them then there these
+they thing things think this those though three through time today told took total tried true turn under until upon
+used using very want water week well were what when where which while white whole will wish with within without word
+work world would write year your
+""".split())
+
+
+def tokenize(text: str) -> list[str]:
+    #Case-insensitive word tokens, punctuation is treated as a separator
+    return re.findall(r"[a-z0-9]+", text.lower().replace("'", "").replace("é", "e"))
+
+
+def deletes(token: str, distance: int) -> set[str]:
+    #All strings reachable from token by removing up to `distance` characters
+    results = {token}
+    frontier = {token}
+    for _ in range(distance):
+        frontier = {word[:i] + word[i + 1:] for word in frontier for i in range(len(word))}
+        results |= frontier
+    return results
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def aliases(entity_id: str) -> list[str]:
+    """Spellings people use for brand names: `Coffee Crisp` as `CoffeeCrisp`, `KitKat` as `Kit Kat`."""
+    variants = []
+    words = re.findall(r"[A-Za-z0-9]+", entity_id)
+    if len(words) > 1:
+        variants.append("".join(words))
+    split = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", entity_id)
+    if split != entity_id:
+        variants.append(split)
+    return variants
+
+
+class EntityGazetteer:
+    """Word-level Aho-Corasick automaton over the graph's entity ids with typo-tolerant lookup.
+    With `with_aliases`, each id is also matched under the spellings from `aliases`."""
+
+    def __init__(self, min_length=3, stopwords=None, with_aliases=False):
+        self.min_length = min_length
+        self.with_aliases = with_aliases
+        self.stopwords = stopwords or {"the", "and", "for", "with", "from", "about", "what", "how", "many", "much"}
+        #Trie nodes: goto transitions, failure links, entities ending at the node and merged outputs
+        self.goto = [{}]
+        self.fail = [0]
+        self.terminal = [[]]
+        self.output = [[]]
+        self.names = defaultdict(set)
+        self.vocabulary = set()
+        self.delete_index = defaultdict(set)
+        self.dirty = False
+
+    def __len__(self):
+        return len(self.names)
+
+    def _max_distance(self, token: str) -> int:
+        #Short tokens have too many neighbours one edit away to correct safely
+        if len(token) >= 9:
+            return 2
+        if len(token) >= 5:
+            return 1
+        return 0
+
+    def add(self, entity_ids) -> int:
+        """Insert entity ids, the failure links are rebuilt lazily on the next match."""
+        added = 0
+        for entity_id in entity_ids:
+            if not entity_id:
+                continue
+            for name in [str(entity_id)] + (aliases(str(entity_id)) if self.with_aliases else []):
+                added += self._insert(name, str(entity_id))
+        return added
+
+    def _insert(self, name: str, entity_id: str) -> int:
+        tokens = tuple(tokenize(name))
+        if not tokens or len(" ".join(tokens)) < self.min_length:
+            return 0
+        if len(tokens) == 1 and tokens[0] in self.stopwords:
+            return 0
+        if tokens in self.names:
+            self.names[tokens].add(entity_id)
+            return 0
+        state = 0
+        for token in tokens:
+            if token not in self.goto[state]:
+                self.goto.append({})
+                self.terminal.append([])
+                self.goto[state][token] = len(self.goto) - 1
+            state = self.goto[state][token]
+        self.terminal[state].append(tokens)
+        for token in tokens:
+            if token not in self.vocabulary:
+                self.vocabulary.add(token)
+                for variant in deletes(token, self._max_distance(token)):
+                    self.delete_index[variant].add(token)
+        self.dirty = True
+        self.names[tokens].add(entity_id)
+        return 1
+
+    def _build(self):
+        #Breadth-first pass to set failure links and merge outputs along them
+        self.fail = [0] * len(self.goto)
+        self.output = [list(own) for own in self.terminal]
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and token not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(token, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+        self.dirty = False
+
+    def correct(self, token: str) -> str:
+        """Map a possibly misspelled token onto the closest known entity token."""
+        if token in self.vocabulary or token in COMMON_WORDS or token in self.stopwords:
+            return token
+        distance = self._max_distance(token)
+        if not distance:
+            return token
+        candidates = set()
+        for variant in deletes(token, distance):
+            candidates |= self.delete_index.get(variant, set())
+        candidates -= COMMON_WORDS
+        best, best_distance = token, distance + 1
+        for candidate in sorted(candidates):
+            d = edit_distance(token, candidate)
+            if d < best_distance:
+                best, best_distance = candidate, d
+        return best
+
+    def match(self, text: str, fuzzy=True) -> list[str]:
+        """Entity ids mentioned in the text, longest non-overlapping matches first.
+        With fuzzy=False tokens must match exactly, no typo correction. Single typo-corrected or
+        everyday words are weak, a result made only of those is no match."""
+        if self.dirty:
+            self._build()
+        raw = tokenize(text)
+        tokens = [self.correct(token) if fuzzy else token for token in raw]
+        spans = []
+        state = 0
+        for end, token in enumerate(tokens):
+            while state and token not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(token, 0)
+            for entity_tokens in self.output[state]:
+                spans.append((end - len(entity_tokens) + 1, end, entity_tokens))
+
+        #Prefer longer spans, then drop anything overlapping an accepted span
+        spans.sort(key=lambda span: (span[0] - span[1], span[0]))
+        taken = set()
+        matches = []
+        for start, end, entity_tokens in spans:
+            positions = set(range(start, end + 1))
+            if positions & taken:
+                continue
+            taken |= positions
+            matches.append((start, entity_tokens))
+        matches.sort()
+        if all(len(entity_tokens) == 1 and (tokens[start] != raw[start] or entity_tokens[0] in COMMON_WORDS)
+               for start, entity_tokens in matches):
+            return []
+
+        entity_ids = []
+        for _, entity_tokens in matches:
+            for entity_id in sorted(self.names[entity_tokens]):
+                if entity_id not in entity_ids:
+                    entity_ids.append(entity_id)
+        return entity_ids
+
+    async def load(self, driver: AsyncDriver, labels=None) -> int:
+        """Load every __Entity__ id from Neo4j, or only those carrying one of `labels`."""
+        records, _, _ = await driver.execute_query(
+            "MATCH (e:__Entity__) WHERE e.id IS NOT NULL "
+            "AND ($labels IS NULL OR any(label IN labels(e) WHERE label IN $labels)) RETURN e.id AS id",
+            {"labels": list(labels) if labels else None},
+            routing_=RoutingControl.READ,
+        )
+        return self.add(record["id"] for record in records)
+
+
+async def compare_recall(questions, gazetteer: EntityGazetteer, entity_chain):
+    """Compare the gazetteer against the LLM extractor: recall counts LLM entities the gazetteer also
+    found, precision counts gazetteer matches the LLM also found."""
+    found, total, correct, matched_total, fallbacks = 0, 0, 0, 0, 0
+    for question in questions:
+        llm_entities = (await entity_chain.ainvoke(question)).link
+        matched = gazetteer.match(question)
+        if not matched:
+            fallbacks += 1
+        matched_tokens = {" ".join(tokenize(entity)) for entity in matched}
+        llm_tokens = {" ".join(tokenize(entity)) for entity in llm_entities} - {""}
+        for normalized in llm_tokens:
+            total += 1
+            if any(normalized in m or m in normalized for m in matched_tokens):
+                found += 1
+        for m in matched_tokens:
+            matched_total += 1
+            if any(normalized in m or m in normalized for normalized in llm_tokens):
+                correct += 1
+        print(f"{question}\n  llm: {llm_entities}\n  gazetteer: {matched}")
+    recall = found / total if total else 0.0
+    precision = correct / matched_total if matched_total else 0.0
+    print(f"\nRecall vs LLM extractor: {recall:.2%} ({found}/{total} entities)")
+    print(f"Precision vs LLM extractor: {precision:.2%} ({correct}/{matched_total} matches)")
+    print(f"Questions needing the LLM fallback: {fallbacks}/{len(questions)}")
+    return recall, precision
+
+
+if __name__ == "__main__":
+    import asyncio
+    import sys
+
+    #Usage: python gazetteer.py eval/questions.txt
+    from app import entity_chain, neo4j_driver
+
+    async def main(path):
+        with open(path, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        gazetteer = EntityGazetteer()
+        print(f"Loaded {await gazetteer.load(neo4j_driver)} entities")
+        await compare_recall(questions, gazetteer, entity_chain)
+        await neo4j_driver.close()
+
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "eval/questions.txt"))
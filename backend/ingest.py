@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+
+def content_hash(text: str) -> str:
+    #Normalize case and whitespace so trivially different copies hash the same
+    normalized = re.sub(r'\s+', ' ', text).strip().lower()
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class GraphIngestQueue:
+    """Bounded background queue that batches write-back documents into the graph."""
+
+    def __init__(self, flush, chunker, max_size=1000, batch_size=20, flush_interval=2.0, seen_size=10000):
+        #flush is an async callable taking a list of Documents, chunker splits text into Documents
+        self.flush = flush
+        self.chunker = chunker
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.seen_size = seen_size
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.seen = OrderedDict()
+        self.worker = None
+
+        #Metrics
+        self.enqueued = 0
+        self.duplicates = 0
+        self.dropped = 0
+        self.flushed_documents = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.last_lag = 0.0
+        self.last_flush_seconds = 0.0
+
+    def start(self):
+        if self.worker is None:
+            self.worker = asyncio.create_task(self._run())
+
+    def submit(self, text: str) -> bool:
+        """Queue text for ingestion without waiting. Returns False if it was skipped."""
+        if not text.strip():
+            return False
+        key = content_hash(text)
+        if key in self.seen:
+            self.seen.move_to_end(key)
+            self.duplicates += 1
+            return False
+
+        documents = self.chunker(text)
+        if self.queue.maxsize and self.queue.qsize() + len(documents) > self.queue.maxsize:
+            #Shed write-back load rather than slow down the request path
+            self.dropped += len(documents)
+            return False
+
+        now = time.monotonic()
+        for doc in documents:
+            self.queue.put_nowait((now, doc))
+        self.enqueued += len(documents)
+        self.seen[key] = None
+        if len(self.seen) > self.seen_size:
+            self.seen.popitem(last=False)
+        return True
+
+    async def _next_batch(self):
+        #Block for the first item then collect more until the batch is full or the interval passes
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _process(self, batch):
+        started = time.monotonic()
+        self.last_lag = started - batch[0][0]
+        try:
+            await self.flush([doc for _, doc in batch])
+            self.flushed_documents += len(batch)
+        except Exception as e:
+            self.failed_batches += 1
+            print(f"Error ingesting batch of {len(batch)} documents: {str(e)}")
+        finally:
+            self.batches += 1
+            self.last_flush_seconds = time.monotonic() - started
+            for _ in batch:
+                self.queue.task_done()
+
+    async def _run(self):
+        while True:
+            batch = await self._next_batch()
+            await self._process(batch)
+
+    async def drain(self, timeout=30.0):
+        """Wait for queued documents to be flushed, then stop the worker."""
+        if self.worker is None:
+            self.start()
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            print(f"Ingest drain timed out with {self.queue.qsize()} documents left")
+        self.worker.cancel()
+        try:
+            await self.worker
+        except asyncio.CancelledError:
+            pass
+        self.worker = None
+
+    def stats(self) -> dict:
+        oldest_age = 0.0
+        if not self.queue.empty():
+            #Peek at the oldest pending item for the current lag
+            oldest_age = time.monotonic() - self.queue._queue[0][0]
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_lag_seconds": round(max(oldest_age, 0.0), 3),
+            "last_batch_lag_seconds": round(self.last_lag, 3),
+            "last_flush_seconds": round(self.last_flush_seconds, 3),
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped,
+            "flushed_documents": self.flushed_documents,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+        }
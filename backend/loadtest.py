@@ -0,0 +1,164 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import time
+
+import httpx
+
+from fakes import PRODUCTS
+
+#Question templates per path, RAG ones avoid location cues so the intent router keeps them local
+RAG_TEMPLATES = [
+    "What ingredients are in {product}?",
+    "Which flavours of {product} are there?",
+    "Give me a dessert recipe with {product}.",
+    "Does {product} contain caramel?",
+]
+LOCATION_TEMPLATES = [
+    "Where can I buy {product} near me?",
+    "Which stores near me sell {product}?",
+]
+#Spread location requests over a grid of points, some share a geohash cell and hit the Places cache
+ORIGIN = (43.6532, -79.3832)
+
+
+def percentile(values, q) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+
+def chat_payloads(path: str, n: int) -> list[dict]:
+    payloads = []
+    for i in range(n):
+        product = PRODUCTS[i % len(PRODUCTS)]
+        if path == "rag":
+            #A name per request keeps every question out of the per-user answer cache
+            question = RAG_TEMPLATES[(i // len(PRODUCTS)) % len(RAG_TEMPLATES)].format(product=product)
+            payloads.append({"question": question, "name": f"bench-{i}"})
+        elif path == "cached":
+            question = RAG_TEMPLATES[i % 2].format(product=PRODUCTS[0])
+            payloads.append({"question": question, "name": "bench"})
+        else:
+            question = LOCATION_TEMPLATES[i % len(LOCATION_TEMPLATES)].format(product=product)
+            payloads.append({
+                "question": question, "name": f"bench-{i}",
+                "lat": ORIGIN[0] + (i % 7) * 0.01, "lng": ORIGIN[1] + (i % 5) * 0.01,
+            })
+    return payloads
+
+
+async def run(name: str, calls, concurrency: int) -> dict:
+    """Run the async callables with at most `concurrency` in flight, time each one."""
+    latencies, errors = [], 0
+    pending = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for call in pending:
+            started = time.perf_counter()
+            try:
+                await call()
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"  {name} error: {str(e)}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "path": name,
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 1),
+        "p95_ms": round(percentile(latencies, 0.95), 1),
+        "p99_ms": round(percentile(latencies, 0.99), 1),
+    }
+
+
+def post_chat(client: httpx.AsyncClient, payload: dict):
+    async def call():
+        response = await client.post("/api/chat", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"{response.status_code} {response.text[:200]}")
+    return call
+
+
+def stage_means(metrics_text: str) -> dict:
+    #Mean milliseconds per stage from the Prometheus histogram sums and counts
+    sums = dict(re.findall(r'chatbot_stage_seconds_sum\{stage="([^"]+)"\} (\S+)', metrics_text))
+    counts = dict(re.findall(r'chatbot_stage_seconds_count\{stage="([^"]+)"\} (\S+)', metrics_text))
+    return {stage: round(float(sums[stage]) / float(counts[stage]) * 1000, 1)
+            for stage in sums if float(counts.get(stage, 0))}
+
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/ready")).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"Backend not ready after {timeout:.0f}s")
+
+
+async def benchmark(client: httpx.AsyncClient, args, app=None) -> list[dict]:
+    await wait_ready(client, args.ready_timeout)
+    results = []
+    for path in args.paths:
+        if path == "writeback":
+            if app is None:
+                print("Skipping writeback, it is only driven in process")
+                continue
+            #The ingest queue's flush is add_to_graph with the cache and backfill callbacks
+            questions = [payload["question"] + f" Asked {i} times." for i, payload in enumerate(chat_payloads("rag", args.requests))]
+            calls = [lambda q=q: app.ingest_queue.flush(app.get_text_chunks_langchain(q)) for q in questions]
+        else:
+            calls = [post_chat(client, payload) for payload in chat_payloads(path, args.requests)]
+        if path == "cached":
+            #Fill the cache before timing
+            await calls[0]()
+            await calls[1]()
+        result = await run(path, calls, args.concurrency)
+        print(f"{path:<10} {result['requests']:>8} {result['errors']:>6} {result['rps']:>8} "
+              f"{result['p50_ms']:>8} {result['p95_ms']:>8} {result['p99_ms']:>8}")
+        results.append(result)
+    stages = stage_means((await client.get("/metrics")).text)
+    print("\nMean ms per stage: " + ", ".join(f"{stage} {ms}" for stage, ms in sorted(stages.items())))
+    return results
+
+
+async def main(args):
+    print(f"{'path':<10} {'requests':>8} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=60.0) as client:
+            results = await benchmark(client, args)
+    else:
+        #In process against the fakes, app reads FAKE_SERVICES at import
+        os.environ.setdefault("FAKE_SERVICES", "all")
+        import app
+        async with app.app.router.lifespan_context(app.app):
+            transport = httpx.ASGITransport(app=app.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+                results = await benchmark(client, args, app)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"concurrency": args.concurrency, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive /api/chat at a fixed concurrency and report latency per path")
+    parser.add_argument("--url", help="benchmark a running server instead of the app in process with fakes")
+    parser.add_argument("--requests", type=int, default=200, help="requests per path")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--paths", nargs="+", default=["rag", "location", "cached", "writeback"],
+                        choices=["rag", "location", "cached", "writeback"])
+    parser.add_argument("--ready-timeout", type=float, default=30.0)
+    parser.add_argument("--json", help="write the results to this file, e.g. to compare runs")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,178 @@
+import asyncio
+import bisect
+import contextvars
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+#Latency buckets in seconds, from a cache hit to a slow LLM call
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+#Prompt size buckets in tokens, around the context packer's default budget of 2000
+TOKEN_BUCKETS = (250, 500, 1000, 1500, 2000, 2500, 3000, 4000, 8000)
+
+#Spans of the current request when it asked for a trace, None otherwise
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        #Per label set: [bucket counts..., +Inf count], sum
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        series = self.series.get(key)
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauges:
+    """Gauges read from a callback at scrape time, e.g. cache stats."""
+
+    def __init__(self, name: str, help: str, labelnames, collect):
+        #collect returns {label values tuple: value}
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in self.collect().items():
+            lines.append(f"{self.name}{format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                print(f"Error rendering metric {metric.name}: {str(e)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+STAGE_SECONDS = registry.register(Histogram(
+    "chatbot_stage_seconds", "Time spent in each stage of answering a question.", ["stage"],
+))
+LLM_TOKENS = registry.register(Counter(
+    "chatbot_llm_tokens_total", "LLM tokens used, by chain and prompt or completion.", ["chain", "kind"],
+))
+LLM_CALLS = registry.register(Counter("chatbot_llm_calls_total", "LLM calls by chain.", ["chain"]))
+ANSWERS = registry.register(Counter("chatbot_answers_total", "Answered questions by path.", ["path"]))
+CONTEXT_TOKENS = registry.register(Histogram(
+    "chatbot_context_tokens", "Tokens in each packed prompt, the whole prompt and its retrieved context.", ["part"],
+    buckets=TOKEN_BUCKETS,
+))
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block into chatbot_stage_seconds and the request trace if one is being recorded.
+    Cancelled blocks are not recorded, they are work thrown away rather than latency."""
+    started = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        started = None
+        raise
+    finally:
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, stage=stage)
+            trace = current_trace.get()
+            if trace is not None:
+                trace.append((stage, elapsed))
+
+
+def start_trace(enabled: bool):
+    #The list is shared with tasks spawned by the request, they copy the context but not the list
+    trace = [] if enabled else None
+    current_trace.set(trace)
+    return trace
+
+
+def server_timing(trace) -> str:
+    """Format spans as a Server-Timing header value, durations in milliseconds."""
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in trace)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """Count prompt and completion tokens of every LLM call, labelled by the first known chain tag."""
+
+    def __init__(self, chains=()):
+        self.chains = set(chains)
+
+    def on_llm_end(self, response, *, tags=None, **kwargs):
+        chain = next((tag for tag in tags or [] if tag in self.chains), "other")
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+        LLM_CALLS.inc(chain=chain)
+        LLM_TOKENS.inc(prompt_tokens, chain=chain, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, chain=chain, kind="completion")
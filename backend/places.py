@@ -0,0 +1,111 @@
+import asyncio
+
+from cache import TTLCache
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+PLACES_ENDPOINT = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
+
+
+def geohash_encode(lat: float, lng: float, precision: int = 6) -> str:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, value, even = [], 0, 0, True
+    while len(chars) < precision:
+        #Alternate between longitude and latitude bits, starting with longitude
+        target, coord = (lng_range, lng) if even else (lat_range, lat)
+        mid = (target[0] + target[1]) / 2
+        if coord >= mid:
+            value = (value << 1) | 1
+            target[0] = mid
+        else:
+            value <<= 1
+            target[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return "".join(chars)
+
+
+def geohash_center(cell: str) -> tuple[float, float]:
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in cell:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            target = lng_range if even else lat_range
+            mid = (target[0] + target[1]) / 2
+            if (value >> shift) & 1:
+                target[0] = mid
+            else:
+                target[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lng_range[0] + lng_range[1]) / 2
+
+
+class PlacesError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Places API returned {status_code}")
+        self.status_code = status_code
+        self.text = text
+
+
+class PlacesClient:
+    """Nearby-search client with a geohash-bucketed result cache.
+
+    `http_client` is any object with an async `get(url, params=...)` returning an
+    httpx-style response, so a pooled httpx.AsyncClient, one with a mock transport
+    or a client pointed at a local stub server via `endpoint_url` all work.
+    """
+
+    def __init__(self, http_client, api_key=None, endpoint_url=PLACES_ENDPOINT,
+                 precision=6, max_entries=10000, ttl=900.0):
+        self.http_client = http_client
+        self.api_key = api_key
+        self.endpoint_url = endpoint_url
+        self.precision = precision
+        self.cache = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.in_flight = {}
+        self.requests = 0
+
+    async def nearby(self, keyword: str, lat: float, lng: float, radius: int = 10500) -> list[dict]:
+        """Places results for keyword around (lat, lng), shared by everyone in the same geohash cell."""
+        cell = geohash_encode(lat, lng, self.precision)
+        key = (keyword.strip().lower(), cell, radius)
+        results = self.cache.get(key)
+        if results is not None:
+            return results
+
+        #Concurrent misses for the same key share one request
+        pending = self.in_flight.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(self._fetch(key))
+            self.in_flight[key] = pending
+            pending.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(pending)
+
+    async def _fetch(self, key) -> list[dict]:
+        keyword, cell, radius = key
+        #Search from the cell center so the cached answer is the same for the whole cell
+        center_lat, center_lng = geohash_center(cell)
+        params = {
+            'keyword': keyword,
+            'location': f'{center_lat},{center_lng}',
+            'radius': radius,
+            'key': self.api_key
+        }
+        self.requests += 1
+        response = await self.http_client.get(self.endpoint_url, params=params)
+        if response.status_code != 200:
+            raise PlacesError(response.status_code, response.text)
+        data = response.json()
+        results = data.get('results', [])
+        #Only cache real answers, not quota or auth failures reported in the body
+        if data.get('status', 'OK') in ('OK', 'ZERO_RESULTS'):
+            self.cache.set(key, results)
+        return results
+
+    def stats(self) -> dict:
+        stats = self.cache.stats()
+        stats["api_requests"] = self.requests
+        return stats
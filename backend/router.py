@@ -0,0 +1,153 @@
+import math
+import re
+import time
+
+from gazetteer import EntityGazetteer
+
+#Weighted lexical cues for "where can I buy it" intent, summed with BIAS and squashed to a probability
+LOCATION_CUES = [
+    (r"\bwhere (can|could|do|would|should|might) (i|we|you|one) (buy|get|find|purchase|pick up|grab)\b", 4.0),
+    (r"\bwhere (to|is|are)\b.*\b(buy|sold|sell|sells|available|stocked|found)\b", 3.0),
+    (r"\bwhere\b", 1.0),
+    (r"\bnear (me|here|by|my)\b|\bnearby\b|\bnearest\b|\bclosest\b|\bclose (to me|by)\b", 3.0),
+    (r"\baround (me|here)\b|\b(my|this|the) (area|city|town|neighbou?rhood)\b", 2.0),
+    (r"\b(store|stores|shop|shops|supermarket|supermarkets|grocery|groceries|pharmacy|retailer|retailers)\b", 2.0),
+    (r"\b(buy|purchase)\b", 1.5),
+    (r"\bin stock\b|\bcarr(y|ies)\b|\bsells?\b|\bstock\b", 1.5),
+    (r"\b(recipe|recipes|ingredient|ingredients|calorie|calories|protein|sugar|sodium|nutrition|nutritional)\b", -2.5),
+    (r"\b(allergen|allergens|allergy|gluten|vegan|caffeine|serving|flavou?rs?|contain|contains|healthy)\b", -2.5),
+    (r"\bhow (many|much)\b", -1.5),
+]
+BIAS = -1.0
+
+
+class IntentRouter:
+    """Decide location intent locally and only defer to the locate LLM when unsure.
+
+    `route` returns (is_location, products) when the lexical score is at least `threshold`
+    confident either way, and None otherwise. Each side needs evidence of its own: a question
+    that matches no cue, or cues pointing both ways, goes to the LLM rather than being called
+    informational. A location question also needs a product named exactly or by alias, typos
+    go to the LLM.
+    """
+
+    def __init__(self, products: EntityGazetteer, threshold=0.85, cues=LOCATION_CUES, bias=BIAS):
+        self.products = products
+        self.threshold = threshold
+        self.cues = [(re.compile(pattern), weight) for pattern, weight in cues]
+        self.bias = bias
+
+        #Metrics
+        self.local = 0
+        self.deferred = 0
+
+    def evidence(self, question: str) -> list[float]:
+        #Weights of the cues the question matches
+        text = question.lower()
+        return [weight for pattern, weight in self.cues if pattern.search(text)]
+
+    def probability(self, question: str) -> float:
+        score = self.bias + sum(self.evidence(question))
+        return 1 / (1 + math.exp(-score))
+
+    def route(self, question: str):
+        weights = self.evidence(question)
+        probability = 1 / (1 + math.exp(-(self.bias + sum(weights))))
+        #Conflicting cues, e.g. "sugar" and "near me", go to the LLM as well
+        if probability <= 1 - self.threshold and weights and all(weight < 0 for weight in weights):
+            self.local += 1
+            return False, []
+        if probability >= self.threshold:
+            products = self.products.match(question, fuzzy=False)
+            if products:
+                self.local += 1
+                return True, products
+        self.deferred += 1
+        return None
+
+    def stats(self) -> dict:
+        total = self.local + self.deferred
+        return {
+            "threshold": self.threshold,
+            "products": len(self.products),
+            "local": self.local,
+            "deferred": self.deferred,
+            "local_ratio": round(self.local / total, 4) if total else 0.0,
+        }
+
+
+def load_labelled(path: str) -> list[tuple[bool, list[str], str]]:
+    """Read `label<TAB>products separated by ;<TAB>question` lines, label is location or info."""
+    samples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            label, products, question = line.rstrip("\n").split("\t")
+            samples.append((label == "location", [p for p in products.split(";") if p], question))
+    return samples
+
+
+async def evaluate(samples, router: IntentRouter, locate_chain=None):
+    """Accuracy of local decisions and product recall on a labelled sample. With locate_chain,
+    the LLM is timed on every question to estimate the latency the router saves."""
+    correct, decided, product_hits, product_total = 0, 0, 0, 0
+    local_seconds, llm_seconds, saved_seconds = 0.0, 0.0, 0.0
+    for is_location, products, question in samples:
+        started = time.perf_counter()
+        decision = router.route(question)
+        local_seconds += time.perf_counter() - started
+        llm_elapsed = 0.0
+        if locate_chain is not None:
+            started = time.perf_counter()
+            await locate_chain.ainvoke(question)
+            llm_elapsed = time.perf_counter() - started
+            llm_seconds += llm_elapsed
+        if decision is None:
+            print(f"  LLM      {question}")
+            continue
+        decided += 1
+        saved_seconds += llm_elapsed
+        ok = decision[0] == is_location
+        correct += ok
+        if is_location:
+            matched = {" ".join(p.lower().split()) for p in decision[1]}
+            product_total += len(products)
+            product_hits += sum(" ".join(p.lower().split()) in matched for p in products)
+        print(f"  {'ok ' if ok else 'BAD'} {'location' if decision[0] else 'info    '} {question} {decision[1] or ''}")
+
+    n = len(samples)
+    print(f"\nDecided locally: {decided}/{n} ({decided / n if n else 0:.0%}), threshold {router.threshold}")
+    print(f"Accuracy of local decisions: {correct / decided if decided else 0:.2%} ({correct}/{decided})")
+    print(f"Product recall on local location answers: {product_hits}/{product_total}")
+    print(f"Router time per question: {local_seconds / n * 1000 if n else 0:.3f} ms")
+    if locate_chain is not None:
+        print(f"locate_chain time per question: {llm_seconds / n * 1000 if n else 0:.0f} ms, "
+              f"saved {saved_seconds / n * 1000 if n else 0:.0f} ms per request on average")
+    return correct / decided if decided else 0.0
+
+
+if __name__ == "__main__":
+    import argparse
+    import asyncio
+
+    parser = argparse.ArgumentParser(description="Evaluate the local intent router on a labelled sample")
+    parser.add_argument("path", nargs="?", default="eval/intents.tsv")
+    parser.add_argument("--threshold", type=float, default=0.85)
+    parser.add_argument("--offline", action="store_true",
+                        help="take product names from the sample instead of the graph and skip the LLM timing")
+    args = parser.parse_args()
+    samples = load_labelled(args.path)
+
+    async def main():
+        products = EntityGazetteer(with_aliases=True)
+        if args.offline:
+            products.add(p for _, names, _ in samples for p in names)
+            await evaluate(samples, IntentRouter(products, args.threshold))
+            return
+        from app import PRODUCT_LABELS, locate_chain, neo4j_driver
+        print(f"Loaded {await products.load(neo4j_driver, PRODUCT_LABELS)} products")
+        await evaluate(samples, IntentRouter(products, args.threshold), locate_chain)
+        await neo4j_driver.close()
+
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+import csv
+import math
+import re
+from collections import defaultdict
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lng, lats, lngs):
+    """Distance in km from one point to arrays of points."""
+    lat1, lng1 = np.radians(lat), np.radians(lng)
+    lats, lngs = np.radians(np.asarray(lats, dtype=np.float64)), np.radians(np.asarray(lngs, dtype=np.float64))
+    d = np.sin((lats - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lats) * np.sin((lngs - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(d, 1.0)))
+
+
+def rank_by_distance(places: list[dict], lat, lng) -> list[tuple[dict, float]]:
+    """Sort Places API style results by true distance from (lat, lng)."""
+    if not places:
+        return []
+    lats = [place['geometry']['location']['lat'] for place in places]
+    lngs = [place['geometry']['location']['lng'] for place in places]
+    distances = haversine_km(lat, lng, lats, lngs)
+    order = np.argsort(distances, kind="stable")
+    return [(places[i], float(distances[i])) for i in order]
+
+
+def product_tokens(text: str) -> frozenset[str]:
+    return frozenset(re.findall(r"[a-z0-9]+", text.lower().replace("'", "")))
+
+
+class StoreLocator:
+    """Grid index over a store/product availability dataset for offline nearest-store lookups.
+
+    Rows need name, address, lat, lng and products (separated by `;`).
+    """
+
+    def __init__(self, stores: list[dict], cell_degrees=0.1):
+        self.cell_degrees = cell_degrees
+        self.names = [store["name"] for store in stores]
+        self.addresses = [store.get("address", "") for store in stores]
+        self.lats = np.array([float(store["lat"]) for store in stores], dtype=np.float64)
+        self.lngs = np.array([float(store["lng"]) for store in stores], dtype=np.float64)
+
+        #Grid cell -> row ids, and product token -> row ids
+        grid = defaultdict(list)
+        for row, (lat, lng) in enumerate(zip(self.lats, self.lngs)):
+            grid[self._cell(lat, lng)].append(row)
+        self.grid = {cell: np.array(rows, dtype=np.int64) for cell, rows in grid.items()}
+        self.products = defaultdict(set)
+        for row, store in enumerate(stores):
+            for product in str(store.get("products", "")).split(";"):
+                for token in product_tokens(product):
+                    self.products[token].add(row)
+
+    def __len__(self):
+        return len(self.names)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs):
+        """Load stores from a CSV or Parquet file."""
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            stores = pq.read_table(path).to_pylist()
+        else:
+            with open(path, "r", encoding="utf-8", newline="") as f:
+                stores = list(csv.DictReader(f))
+        return cls(stores, **kwargs)
+
+    def _cell(self, lat, lng):
+        return int(math.floor(lat / self.cell_degrees)), int(math.floor(lng / self.cell_degrees))
+
+    def _candidates(self, lat, lng, radius_km) -> np.ndarray:
+        #Every grid cell overlapping the bounding box of the search radius
+        lat_span = radius_km / 111.0
+        lng_span = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+        lat_lo, lng_lo = self._cell(lat - lat_span, lng - lng_span)
+        lat_hi, lng_hi = self._cell(lat + lat_span, lng + lng_span)
+        rows = [
+            self.grid[(i, j)]
+            for i in range(lat_lo, lat_hi + 1)
+            for j in range(lng_lo, lng_hi + 1)
+            if (i, j) in self.grid
+        ]
+        return np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+
+    def _stocking(self, keyword: str) -> set[int]:
+        #Stores carrying a product whose name contains every keyword token
+        tokens = product_tokens(keyword)
+        if not tokens:
+            return set()
+        rows = None
+        for token in tokens:
+            rows = self.products.get(token, set()) if rows is None else rows & self.products.get(token, set())
+        return rows or set()
+
+    def nearest(self, keyword: str, lat, lng, k=4, radius_km=10.5) -> list[dict]:
+        """Up to k nearest stores carrying the product, shaped like Places API results.
+
+        An empty list means the dataset has no coverage and the caller should fall back.
+        """
+        stocking = self._stocking(keyword)
+        if not stocking:
+            return []
+        candidates = self._candidates(lat, lng, radius_km)
+        candidates = candidates[np.isin(candidates, np.fromiter(stocking, dtype=np.int64))]
+        if not candidates.size:
+            return []
+        distances = haversine_km(lat, lng, self.lats[candidates], self.lngs[candidates])
+        within = distances <= radius_km
+        candidates, distances = candidates[within], distances[within]
+        order = np.argsort(distances, kind="stable")[:k]
+        return [
+            {
+                "name": self.names[row],
+                "vicinity": self.addresses[row],
+                "geometry": {"location": {"lat": float(self.lats[row]), "lng": float(self.lngs[row])}},
+            }
+            for row in candidates[order]
+        ]
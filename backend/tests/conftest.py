@@ -0,0 +1,15 @@
+import os
+import sys
+
+#Tests import the backend modules the way uvicorn does, from the backend directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#Everything external is faked unless a test builds a real client itself, set before app is imported
+os.environ.update({
+    "FAKE_SERVICES": "all",
+    "FAKE_LATENCY_JITTER": "0",
+    "AZURE_OPENAI_DEPLOYMENT": "gpt-4o",
+    "AZURE_OPENAI_API_KEY": "test-key",
+    "AZURE_OPENAI_ENDPOINT": "https://example.openai.azure.com",
+    "AZURE_OPENAI_API_VERSION": "2024-06-01",
+})
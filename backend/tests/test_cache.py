@@ -0,0 +1,35 @@
+import asyncio
+
+import numpy as np
+
+from cache import SemanticCache
+from fakes import FakeEmbeddings
+
+
+def test_semantic_cache_reuses_rows_of_evicted_entries():
+    cache = SemanticCache(FakeEmbeddings(), max_entries=2)
+
+    async def ask(question):
+        answer, vector = await cache.lookup("bot", question)
+        if answer is None:
+            cache.store("bot", question, f"answer to {question}", vector)
+        return answer
+
+    for question in ["What is in KitKat?", "What flavours does Aero come in?", "Is Boost vegan?"]:
+        assert asyncio.run(ask(question)) is None
+    #The oldest entry was evicted and its row zeroed for reuse
+    assert len(cache.cache) == 2
+    assert sum(key is not None for key in cache.row_keys) == 2
+    assert not cache.matrix[cache.free_rows].any()
+    assert asyncio.run(ask("what flavours does aero come in")) == "answer to What flavours does Aero come in?"
+    assert asyncio.run(ask("What is in KitKat?")) is None
+    assert cache.used_rows <= cache.capacity
+
+
+def test_semantic_cache_keeps_namespaces_apart():
+    embeddings = FakeEmbeddings()
+    cache = SemanticCache(embeddings, threshold=0.8)
+    vector = np.asarray(embeddings.embed_query("Does Nesquik contain sugar?"), dtype=np.float32)
+    cache.store("alice", "Does Nesquik contain sugar?", "yes", vector)
+    assert asyncio.run(cache.lookup("bob", "Does Nesquik contain any sugar?"))[0] is None
+    assert asyncio.run(cache.lookup("alice", "Does Nesquik contain any sugar?"))[0] == "yes"
@@ -0,0 +1,35 @@
+import asyncio
+import time
+
+import httpx
+
+import app
+from loadtest import chat_payloads
+
+LLM_DELAY_MS = 200
+REQUESTS = 8
+
+
+async def post_all(payloads) -> float:
+    transport = httpx.ASGITransport(app=app.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30.0) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/api/chat", json=payload) for payload in payloads))
+        elapsed = time.perf_counter() - started
+    assert [response.status_code for response in responses] == [200] * len(payloads)
+    return elapsed
+
+
+def test_concurrent_chat_requests_overlap_their_llm_calls(monkeypatch):
+    #Every chain shares the one fake model, give each call a fixed delay
+    llm = next(step for step in app.chain.steps if hasattr(step, "latency_ms"))
+    monkeypatch.setattr(llm, "latency_ms", LLM_DELAY_MS)
+    #Distinct questions and names so neither the answer cache nor single-flight merge them
+    payloads = chat_payloads("rag", REQUESTS + 1)
+
+    single = asyncio.run(post_all(payloads[:1]))
+    total = asyncio.run(post_all(payloads[1:]))
+
+    assert single >= LLM_DELAY_MS / 1000
+    #Serialised handling would take REQUESTS times as long as one request
+    assert total < 2 * single, f"{REQUESTS} concurrent requests took {total:.2f}s, one took {single:.2f}s"
@@ -0,0 +1,16 @@
+from langchain_core.documents import Document
+
+from context import ContextPacker
+
+
+def test_packer_only_cites_web_pages():
+    documents = [
+        Document(page_content="KitKat is a wafer bar.", metadata={"url": "https://www.madewithnestle.ca/kitkat"}),
+        Document(page_content="Aero is an aerated bar.", metadata={"source": "madewithnestle_content.txt"}),
+        Document(page_content="Smarties are candy coated.", metadata={"source": "http://example.com/smarties"}),
+    ]
+    context, _ = ContextPacker().pack("Which bars are there?", [], documents)
+
+    assert "[Source: https://www.madewithnestle.ca/kitkat]" in context
+    assert "[Source: http://example.com/smarties]" in context
+    assert "madewithnestle_content.txt" not in context
@@ -0,0 +1,41 @@
+import numpy as np
+
+from embedding_cache import DiskEmbeddingStore
+
+
+def vector(i: int) -> np.ndarray:
+    return np.full(4, i, dtype=np.float32)
+
+
+def test_torn_writes_are_dropped_before_appending(tmp_path):
+    store = DiskEmbeddingStore(str(tmp_path))
+    store.put_many([("a", vector(1)), ("b", vector(2))])
+    #A writer that crashed mid-row and mid-line
+    with open(store.vectors_path, "ab") as f:
+        f.write(b"\x00" * 6)
+    with open(store.index_path, "a", encoding="utf-8") as f:
+        f.write("torn\t")
+
+    reopened = DiskEmbeddingStore(str(tmp_path))
+    assert len(reopened) == 2
+    reopened.put_many([("c", vector(3))])
+
+    fresh = DiskEmbeddingStore(str(tmp_path))
+    assert sorted(fresh.rows) == ["a", "b", "c"]
+    for key, i in [("a", 1), ("b", 2), ("c", 3)]:
+        assert (fresh.get(key) == vector(i)).all()
+
+
+def test_stores_sharing_a_directory_see_each_others_keys(tmp_path):
+    first = DiskEmbeddingStore(str(tmp_path))
+    second = DiskEmbeddingStore(str(tmp_path))
+    first.put_many([("a", vector(1))])
+    second.put_many([("a", vector(9)), ("b", vector(2))])
+    first.put_many([("c", vector(3))])
+
+    assert (second.get("a") == vector(1)).all()
+    assert (second.get("c") == vector(3)).all()
+    assert (first.get("b") == vector(2)).all()
+    #"a" was written once, by the first store
+    assert len(DiskEmbeddingStore(str(tmp_path))) == 3
+    assert sum(1 for _ in open(first.index_path, encoding="utf-8")) == 3
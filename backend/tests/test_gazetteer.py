@@ -0,0 +1,31 @@
+from gazetteer import EntityGazetteer
+
+#Generic ids of the kind LLMGraphTransformer extracts, next to brand names
+ENTITIES = ["Cake", "Rice", "Think", "KitKat", "Coffee Crisp", "Nestlé", "Nesquik"]
+
+
+def gazetteer() -> EntityGazetteer:
+    gazetteer = EntityGazetteer()
+    gazetteer.add(ENTITIES)
+    return gazetteer
+
+
+def test_everyday_words_are_not_matched_to_entities():
+    g = gazetteer()
+    assert g.match("how long does it take") == []
+    assert g.match("Tell me something nice") == []
+    assert g.match("What do you think") == []
+    assert g.match("Is there a cake recipe?") == []
+
+
+def test_brand_names_still_match():
+    g = gazetteer()
+    assert g.match("What is in a KitKat?") == ["KitKat"]
+    assert g.match("Does cofee crisp have nuts?") == ["Coffee Crisp"]
+    assert g.match("Is KitKat a cake?") == ["KitKat", "Cake"]
+
+
+def test_a_lone_typo_corrected_word_is_left_to_the_llm():
+    g = gazetteer()
+    assert g.correct("nesqik") == "nesquik"
+    assert g.match("Is nesqik good for kids?") == []
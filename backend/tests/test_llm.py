@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+import httpx
+
+from app import build_llm
+from metrics import LLM_TOKENS
+
+
+def completion(content: str) -> dict:
+    return {
+        "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 7, "completion_tokens": 2, "total_tokens": 9},
+    }
+
+
+def stream_body(tokens: list[str]) -> str:
+    chunks = [
+        {"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+         "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]}
+        for token in tokens
+    ]
+    #With stream_options.include_usage the last chunk has no choices, only usage
+    chunks.append({"id": "chatcmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "gpt-4o",
+                   "choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": len(tokens), "total_tokens": 5 + len(tokens)}})
+    return "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+
+
+def test_real_chat_model_sends_only_api_parameters():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json=completion("Hello there"))
+
+    llm = build_llm(http_client=httpx.Client(transport=httpx.MockTransport(handler))).with_config(tags=["answer"])
+    before = LLM_TOKENS.values.get(("answer", "prompt"), 0)
+
+    assert llm.invoke("Hi").content == "Hello there"
+    assert "stream_usage" not in requests[0]
+    assert LLM_TOKENS.values[("answer", "prompt")] - before == 7
+
+
+def test_real_chat_model_reports_usage_when_streaming():
+    requests = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, text=stream_body(["Hel", "lo"]), headers={"content-type": "text/event-stream"})
+
+    llm = build_llm(http_async_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))).with_config(tags=["answer"])
+    before = LLM_TOKENS.values.get(("answer", "completion"), 0)
+
+    async def collect():
+        return "".join([chunk.content async for chunk in llm.astream("Hi")])
+
+    assert asyncio.run(collect()) == "Hello"
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    assert "stream_usage" not in requests[0]
+    assert LLM_TOKENS.values[("answer", "completion")] - before == 2
@@ -0,0 +1,41 @@
+from gazetteer import EntityGazetteer
+from router import IntentRouter
+
+
+def router():
+    products = EntityGazetteer(with_aliases=True)
+    products.add(["KitKat", "Nesquik", "Boost", "Aero", "Coffee Crisp"])
+    return IntentRouter(products)
+
+
+def test_questions_without_cues_go_to_the_llm():
+    intent_router = router()
+    for question in [
+        "Is Nesquik sold at Walmart?",
+        "Can I get KitKat at Costco?",
+        "Does Shoppers Drug Mart have Boost?",
+        "Which Loblaws has Aero in Toronto?",
+        "What is KitKat?",
+    ]:
+        assert intent_router.route(question) is None, question
+
+
+def test_location_needs_an_exact_or_alias_product():
+    intent_router = router()
+    assert intent_router.route("zero sugar drinks near me") is None
+    assert intent_router.route("where can I buy kit kat near me") == (True, ["KitKat"])
+    assert intent_router.route("Where can I buy CoffeeCrisp near me?") == (True, ["Coffee Crisp"])
+    #A misspelled product is left to the LLM
+    assert intent_router.route("Where can I buy Nesqick near me?") is None
+
+
+def test_clear_informational_questions_stay_local():
+    assert router().route("How many calories are in a KitKat?") == (False, [])
+
+
+def test_one_strong_location_cue_and_an_exact_product_decide_locally():
+    intent_router = router()
+    assert intent_router.route("kit kat near me") == (True, ["KitKat"])
+    assert intent_router.route("closest store with aero") == (True, ["Aero"])
+    #A weak cue alone is not enough
+    assert intent_router.route("Where is KitKat made?") is None
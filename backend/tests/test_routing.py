@@ -0,0 +1,20 @@
+import asyncio
+
+import app
+from metrics import STAGE_SECONDS
+
+
+def stage_count(stage: str) -> int:
+    series = STAGE_SECONDS.series.get((stage,))
+    return sum(series[0]) if series else 0
+
+
+def test_local_location_questions_skip_retrieval_and_the_answer_cache(monkeypatch):
+    monkeypatch.setattr(app.intent_router, "route", lambda question: (True, ["KitKat"]))
+    before = {stage: stage_count(stage) for stage in ("retrieval", "answer_cache", "locate")}
+    request = app.ChatRequest(question="Where can I buy KitKat near me?", name="bot")
+
+    kind, products, _ = asyncio.run(app.route_question(request))
+
+    assert (kind, products) == ("location", ["KitKat"])
+    assert {stage: stage_count(stage) for stage in before} == before
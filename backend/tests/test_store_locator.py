@@ -0,0 +1,37 @@
+import asyncio
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import app
+from store_locator import StoreLocator
+
+STORES = [
+    {"name": "Corner Store", "address": "1 King St", "lat": 43.6532, "lng": -79.3832, "products": "KitKat;Aero"},
+    {"name": "Far Mart", "address": "9 Bay St", "lat": 43.7000, "lng": -79.4000, "products": "KitKat"},
+]
+
+
+def test_stores_load_from_parquet(tmp_path):
+    path = str(tmp_path / "stores.parquet")
+    pq.write_table(pa.Table.from_pylist(STORES), path)
+    locator = StoreLocator.from_file(path)
+    assert len(locator) == 2
+    assert [store["name"] for store in locator.nearest("aero", 43.6532, -79.3832)] == ["Corner Store"]
+
+
+def test_store_dataset_loads_as_a_startup_step(tmp_path, monkeypatch):
+    monkeypatch.setenv("STORE_DATASET", str(tmp_path / "missing.parquet"))
+    monkeypatch.setattr(app, "readiness", dict(app.readiness))
+    #A broken dataset is reported, it does not take the app down
+    asyncio.run(app.startup_step("store_locator", lambda: asyncio.to_thread(app.load_store_locator)))
+    assert app.readiness["store_locator"].startswith("error")
+    assert app.store_locator is None
+
+    path = str(tmp_path / "stores.parquet")
+    pq.write_table(pa.Table.from_pylist(STORES), path)
+    monkeypatch.setenv("STORE_DATASET", path)
+    monkeypatch.setattr(app, "store_locator", None)
+    asyncio.run(app.startup_step("store_locator", lambda: asyncio.to_thread(app.load_store_locator)))
+    assert app.readiness["store_locator"] == "ok"
+    assert len(app.store_locator) == 2
@@ -0,0 +1,28 @@
+import asyncio
+
+from starlette.requests import Request
+
+import app
+
+
+async def first_token_then_wait(request: app.ChatRequest):
+    response = await app.chat_stream(request, Request({"type": "http", "headers": []}))
+    events = response.body_iterator
+    while not (event := await anext(events)).startswith("event: token"):
+        pass
+    #The client stops reading, the model stream still finishes in the background
+    await asyncio.sleep(0.1)
+    in_use = app.llm_limiter.in_use
+    rest = [event async for event in events]
+    return in_use, rest
+
+
+def test_stream_releases_the_generation_slot_before_the_client_catches_up(monkeypatch):
+    llm = next(step for step in app.chain.steps if hasattr(step, "token_ms"))
+    monkeypatch.setattr(llm, "token_ms", 0)
+    request = app.ChatRequest(question="What ingredients are in Smarties?", name="stream-test")
+
+    in_use, rest = asyncio.run(first_token_then_wait(request))
+
+    assert in_use == 0
+    assert rest[-1].startswith("event: done")
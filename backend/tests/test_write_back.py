@@ -0,0 +1,40 @@
+import asyncio
+
+import numpy as np
+
+import app
+from fakes import FakeNeo4jGraph
+
+
+def write_back(question: str):
+    return app.add_to_graph(
+        app.get_text_chunks_langchain(question), FakeNeo4jGraph(), app.llm_transformer,
+        driver=app.neo4j_driver, on_new_facts=(app.answer_cache.invalidate,),
+    )
+
+
+def cache_answer(question: str):
+    vector = np.asarray(app.embeddings.embed_query(question), dtype=np.float32)
+    app.answer_cache.store("bot", question, f"answer to {question}", vector / np.linalg.norm(vector))
+
+
+def cached(question: str):
+    return asyncio.run(app.answer_cache.lookup("bot", question))[0]
+
+
+def test_write_back_of_known_facts_keeps_cached_answers():
+    cache_answer("Who makes KitKat?")
+    cache_answer("Is KitKat made with cocoa?")
+    #The fake transformer turns this into KitKat MADE_BY Nestlé, already in the graph
+    asyncio.run(write_back("Who makes KitKat?"))
+    assert cached("Who makes KitKat?") == "answer to Who makes KitKat?"
+    assert cached("Is KitKat made with cocoa?") == "answer to Is KitKat made with cocoa?"
+
+
+def test_new_facts_invalidate_other_answers_but_not_their_source():
+    cache_answer("Tell me about Zesty Bars")
+    cache_answer("Are Zesty Bars sweet?")
+    #Zesty MADE_BY Nestlé is new
+    asyncio.run(write_back("Tell me about Zesty Bars"))
+    assert cached("Tell me about Zesty Bars") == "answer to Tell me about Zesty Bars"
+    assert cached("Are Zesty Bars sweet?") is None
@@ -0,0 +1,209 @@
+import asyncio
+import math
+import re
+import time
+from collections import Counter
+
+import numpy as np
+from langchain_core.documents import Document
+from neo4j import AsyncDriver, RoutingControl
+
+WORD = re.compile(r"\w+")
+
+LOAD_QUERY = """
+MATCH (d:Document)
+WHERE d.embedding IS NOT NULL AND d.text IS NOT NULL
+RETURN elementId(d) AS id, d.text AS text, d.embedding AS embedding,
+       d {.*, embedding: Null, id: Null, text: Null} AS metadata
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    #Close to Lucene's standard analyzer without stop words, which Neo4j fulltext indexes use by default
+    return WORD.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over the whole mirrored corpus."""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.lengths = []
+        self.total_length = 0
+
+    def add(self, text: str) -> int:
+        row = len(self.lengths)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self.postings.setdefault(term, []).append((row, tf))
+        length = sum(counts.values())
+        self.lengths.append(length)
+        self.total_length += length
+        return row
+
+    def search(self, query: str, k: int) -> list[tuple[int, float]]:
+        n = len(self.lengths)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1.0
+        scores = {}
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[row] / avg_length)
+                scores[row] = scores.get(row, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+
+class LocalVectorIndex:
+    """In-process mirror of the Document vector and keyword indexes.
+
+    Cosine search is one matrix-vector product over a contiguous float32 matrix. Hybrid scoring
+    follows Neo4jVector: vector and keyword top-k are each divided by their best score and a
+    document keeps the higher of the two. Drop-in for the retriever's `ainvoke`.
+    """
+
+    def __init__(self, embeddings, k=8):
+        self.embeddings = embeddings
+        self.k = k
+        self.matrix = None
+        self.size = 0
+        self.ids = {}
+        self.texts = []
+        self.metadata = []
+        self.bm25 = BM25Index()
+
+        #Metrics
+        self.searches = 0
+        self.search_seconds = 0.0
+
+    def __len__(self):
+        return self.size
+
+    def _append_vector(self, vector: np.ndarray):
+        if self.matrix is None:
+            self.matrix = np.zeros((1024, vector.shape[0]), dtype=np.float32)
+        elif self.size == self.matrix.shape[0]:
+            #Double the capacity so appends stay amortised O(1)
+            grown = np.zeros((self.matrix.shape[0] * 2, self.matrix.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.matrix[:self.size]
+            self.matrix = grown
+        self.matrix[self.size] = vector
+        self.size += 1
+
+    def add(self, rows) -> int:
+        """Mirror (id, text, embedding, metadata) rows, ids already held are skipped."""
+        added = 0
+        for node_id, text, embedding, metadata in rows:
+            if node_id in self.ids or embedding is None:
+                continue
+            vector = np.asarray(embedding, dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            self._append_vector(vector / norm if norm else vector)
+            self.ids[node_id] = self.size - 1
+            self.texts.append(text)
+            self.metadata.append(metadata or {})
+            self.bm25.add(text)
+            added += 1
+        return added
+
+    async def load(self, driver: AsyncDriver) -> int:
+        """Load every embedded Document from Neo4j."""
+        records, _, _ = await driver.execute_query(LOAD_QUERY, routing_=RoutingControl.READ)
+        #Converting thousands of embedding lists is CPU bound, keep it off the event loop
+        return await asyncio.to_thread(self.add, [(r["id"], r["text"], r["embedding"], r["metadata"]) for r in records])
+
+    def search(self, question: str, vector, k: int = None) -> list[tuple[int, float]]:
+        k = k or self.k
+        if not self.size:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        #Neo4j reports cosine similarity as (1 + cos) / 2
+        similarities = (self.matrix[:self.size] @ query + 1) / 2
+        top = np.argpartition(-similarities, min(k, self.size) - 1)[:k]
+        vector_hits = [(int(i), float(similarities[i])) for i in top]
+        keyword_hits = self.bm25.search(question, k)
+
+        scores = {}
+        for hits in (vector_hits, keyword_hits):
+            best = max((score for _, score in hits), default=0.0)
+            for row, score in hits:
+                if best > 0:
+                    scores[row] = max(scores.get(row, 0.0), score / best)
+        return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+    def document(self, row: int) -> Document:
+        #Same page_content layout as the Neo4j retrieval query
+        return Document(page_content=f"\ntext: {self.texts[row]}", metadata=dict(self.metadata[row]))
+
+    async def ainvoke(self, question: str) -> list[Document]:
+        vector = await self.embeddings.aembed_query(question)
+        started = time.perf_counter()
+        hits = self.search(question, vector)
+        self.searches += 1
+        self.search_seconds += time.perf_counter() - started
+        return [self.document(row) for row, _ in hits]
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.size,
+            "terms": len(self.bm25.postings),
+            "bytes": int(self.matrix.nbytes) if self.matrix is not None else 0,
+            "searches": self.searches,
+            "avg_search_ms": round(self.search_seconds / self.searches * 1000, 3) if self.searches else 0.0,
+        }
+
+
+async def compare(questions, neo4j_retriever, local_index: LocalVectorIndex, k=8):
+    """Recall@k of the local index against the Neo4j retriever, plus latency of both."""
+    def percentile(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else 0.0
+
+    overlap, total = 0, 0
+    remote_times, local_times = [], []
+    for question in questions:
+        #Embed once up front so both paths are timed on search alone
+        await local_index.embeddings.aembed_query(question)
+        started = time.perf_counter()
+        remote = await neo4j_retriever.ainvoke(question)
+        remote_times.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        local = await local_index.ainvoke(question)
+        local_times.append(time.perf_counter() - started)
+
+        remote_texts = {doc.page_content for doc in remote[:k]}
+        local_texts = {doc.page_content for doc in local[:k]}
+        overlap += len(remote_texts & local_texts)
+        total += len(remote_texts)
+    recall = overlap / total if total else 0.0
+    print(f"Recall@{k} of the local index vs Neo4j: {recall:.2%} ({overlap}/{total})")
+    print(f"Neo4j hybrid search: p50 {percentile(remote_times, 0.5):.1f} ms, p95 {percentile(remote_times, 0.95):.1f} ms")
+    print(f"Local hybrid search: p50 {percentile(local_times, 0.5):.1f} ms, p95 {percentile(local_times, 0.95):.1f} ms")
+    return recall
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    #Usage: python vector_mirror.py eval/questions.txt
+    from app import build_vector_retriever, embeddings, neo4j_driver
+
+    async def main(path):
+        with open(path, "r", encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+        k = int(os.getenv("VECTOR_TOP_K", "8"))
+        local_index = LocalVectorIndex(embeddings, k=k)
+        started = time.perf_counter()
+        print(f"Loaded {await local_index.load(neo4j_driver)} documents in {time.perf_counter() - started:.1f}s")
+        await compare(questions, build_vector_retriever(embeddings), local_index, k=k)
+        await neo4j_driver.close()
+
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else "eval/questions.txt"))
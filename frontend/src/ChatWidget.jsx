@@ -14,7 +14,6 @@ import userIcon from './assets/usericon.png';
 import sendMessageIcon from './assets/send.png';
 import micIcon from './assets/mic.png';
 
-import axios from 'axios';
 import Markdown from 'react-markdown';
 
 
@@ -181,20 +180,65 @@ function ChatWidget({ label = 'Quicky' }) {
     }
 
     try {
-      const response = await axios.post('http://localhost:8000/api/chat', {
-        question: textToSend,
-        name: botName,
-        lat: coords.lat || null,
-        lng: coords.lng || null,
+      const response = await fetch('http://localhost:8000/api/chat/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          question: textToSend,
+          name: botName,
+          lat: coords.lat || null,
+          lng: coords.lng || null,
+        }),
       });
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
 
-      const botReply = {
-        sender: 'bot',
-        text: response.data.answer,
-        timestamp: new Date().toISOString()
+      //Add the bot message on the first chunk and grow it as events arrive
+      const botTimestamp = new Date().toISOString();
+      let botText = '';
+      let started = false;
+      const updateBotReply = (chunk) => {
+        botText += chunk;
+        if (!started) {
+          started = true;
+          setIsTyping(false);
+          setMessages(prev => [...prev, { sender: 'bot', text: botText, timestamp: botTimestamp }]);
+          return;
+        }
+        setMessages(prev => {
+          const updated = [...prev];
+          updated[updated.length - 1] = { ...updated[updated.length - 1], text: botText };
+          return updated;
+        });
       };
 
-      setMessages(prev => [...prev, botReply]);
+      //Parse the server-sent events stream
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let finished = false;
+      while (!finished) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const eventLine = rawEvent.split('\n').find(line => line.startsWith('event: '));
+          const dataLine = rawEvent.split('\n').find(line => line.startsWith('data: '));
+          if (!eventLine || !dataLine) continue;
+          const eventType = eventLine.slice(7);
+          const data = JSON.parse(dataLine.slice(6));
+          if (eventType === 'token' || eventType === 'location') {
+            updateBotReply(data.text);
+          } else if (eventType === 'error') {
+            throw new Error(data.detail);
+          } else if (eventType === 'done') {
+            finished = true;
+          }
+        }
+      }
 
     } catch (error) {
       console.error('Error fetching bot response:', error);
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from langchain_community.graphs.graph_document import GraphDocument
+from langchain_core.documents import Document
+from langchain_experimental.graph_transformers import LLMGraphTransformer
+from langchain_openai import AzureOpenAIEmbeddings
+from neo4j import GraphDatabase
+
+from dedup import dedupe, report
+from page_loader import PageLoader
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from chat_model import build_chat_model
+from embedding_cache import CachedEmbeddings
+
+#Load environment variables from .env file
+load_dotenv()
+
+INDEX_QUERIES = [
+    "CREATE CONSTRAINT entity_id IF NOT EXISTS FOR (n:__Entity__) REQUIRE n.id IS UNIQUE",
+    "CREATE CONSTRAINT document_id IF NOT EXISTS FOR (d:Document) REQUIRE d.id IS UNIQUE",
+    "CREATE FULLTEXT INDEX fulltext_entity_id IF NOT EXISTS FOR (n:__Entity__) ON EACH [n.id]",
+    #Changed and removed pages are retracted by url
+    "CREATE INDEX document_url IF NOT EXISTS FOR (d:Document) ON (d.url)",
+    #Keyword index used by Neo4jVector hybrid search
+    "CREATE FULLTEXT INDEX keyword IF NOT EXISTS FOR (n:Document) ON EACH [n.text]",
+]
+VECTOR_INDEX_QUERY = """
+CREATE VECTOR INDEX vector IF NOT EXISTS FOR (d:Document) ON (d.embedding)
+OPTIONS {indexConfig: {`vector.dimensions`: $dimensions, `vector.similarity_function`: 'cosine'}}
+"""
+
+DOCUMENT_QUERY = """
+UNWIND $rows AS row
+MERGE (d:Document {id: row.id})
+SET d.text = row.text, d += row.metadata
+FOREACH (_ IN CASE WHEN row.embedding IS NULL THEN [] ELSE [1] END | SET d.embedding = row.embedding)
+"""
+ENTITY_QUERY = """
+UNWIND $rows AS row
+MERGE (n:__Entity__ {id: row.id})
+SET n += row.properties
+WITH n, row
+CALL apoc.create.addLabels(n, [row.type]) YIELD node
+RETURN count(*)
+"""
+MENTIONS_QUERY = """
+UNWIND $rows AS row
+MATCH (d:Document {id: row.document})
+MATCH (n:__Entity__ {id: row.entity})
+MERGE (d)-[:MENTIONS]->(n)
+"""
+RETRACT_QUERY = """
+UNWIND $urls AS url
+MATCH (d:Document {url: url})
+DETACH DELETE d
+RETURN count(*) AS deleted
+"""
+RELATIONSHIP_QUERY = """
+UNWIND $rows AS row
+MATCH (s:__Entity__ {id: row.source})
+MATCH (t:__Entity__ {id: row.target})
+CALL apoc.merge.relationship(s, row.type, {}, row.properties, t, {}) YIELD rel
+RETURN count(*)
+"""
+
+
+def chunk_id(doc: Document) -> str:
+    return hashlib.sha256(f"{doc.metadata.get('url', '')}\0{doc.page_content}".encode("utf-8")).hexdigest()
+
+
+def serialize(key: str, graph_doc: GraphDocument) -> dict:
+    return {
+        "chunk_id": key,
+        "document": {"page_content": graph_doc.source.page_content, "metadata": graph_doc.source.metadata},
+        "nodes": [{"id": n.id, "type": n.type, "properties": n.properties} for n in graph_doc.nodes],
+        "relationships": [
+            {
+                "source": {"id": r.source.id, "type": r.source.type},
+                "target": {"id": r.target.id, "type": r.target.type},
+                "type": r.type,
+                "properties": r.properties,
+            }
+            for r in graph_doc.relationships
+        ],
+    }
+
+
+class CheckpointStore:
+    """Append-only JSON Lines store of transformed chunks keyed by content hash."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.done = set()
+        for record in self.records():
+            self.done.add(record["chunk_id"])
+        self.file = open(path, "a", encoding="utf-8")
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    #A crash mid-write can leave a partial last line
+                    continue
+
+    def append(self, record: dict):
+        self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+        self.done.add(record["chunk_id"])
+
+    def close(self):
+        self.file.close()
+
+
+def current_records(records, keys: set):
+    """Records of the chunks in this run, once each. Chunks of earlier runs stay in the store
+    for reuse but are not written again."""
+    seen = set()
+    for record in records:
+        key = record["chunk_id"]
+        if key in keys and key not in seen:
+            seen.add(key)
+            yield record
+
+
+async def transform(chunks, llm_transformer, store: CheckpointStore, workers=8):
+    """Run the LLM graph transformer over chunks not yet in the store with bounded parallelism."""
+    pending = [(key, doc) for key, doc in chunks if key not in store.done]
+    print(f"{len(chunks) - len(pending)} chunks already transformed, {len(pending)} to go")
+    semaphore = asyncio.Semaphore(workers)
+    stats = {"done": 0, "failed": 0}
+    started = time.monotonic()
+
+    async def run(key, doc):
+        async with semaphore:
+            try:
+                graph_docs = await llm_transformer.aconvert_to_graph_documents([doc])
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"Failed to transform chunk {key[:12]}: {str(e)}")
+                return
+        for graph_doc in graph_docs:
+            store.append(serialize(key, graph_doc))
+        stats["done"] += 1
+        if stats["done"] % 25 == 0:
+            elapsed = time.monotonic() - started
+            print(f"  transformed {stats['done']}/{len(pending)} chunks ({stats['done'] / elapsed:.2f} chunks/s)")
+
+    await asyncio.gather(*(run(key, doc) for key, doc in pending))
+    elapsed = time.monotonic() - started
+    print(f"Transformed {stats['done']} chunks, {stats['failed']} failed in {elapsed:.1f}s "
+          f"({stats['done'] / elapsed if elapsed else 0:.2f} chunks/s)")
+    return stats
+
+
+def create_indexes(driver, dimensions=None):
+    #IF NOT EXISTS makes every statement safe to rerun
+    for query in INDEX_QUERIES:
+        driver.execute_query(query)
+    if dimensions:
+        driver.execute_query(VECTOR_INDEX_QUERY, dimensions=dimensions)
+    print("Constraints and indexes are in place")
+
+
+def load_retracted(delta_path: str) -> list[str]:
+    """URLs whose Document nodes are out of date: pages the scraper's delta marks changed or removed."""
+    with open(delta_path, "r", encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+    return sorted({entry["url"] for entry in entries if entry["change"] in ("changed", "removed")})
+
+
+def retract_documents(driver, urls, batch_size=500) -> int:
+    #The chunks of the current version are written again afterwards, entities and relationships are kept
+    deleted = 0
+    for i in range(0, len(urls), batch_size):
+        records, _, _ = driver.execute_query(RETRACT_QUERY, urls=urls[i:i + batch_size])
+        deleted += records[0]["deleted"]
+    print(f"Retracted {deleted} documents of {len(urls)} changed or removed pages")
+    return deleted
+
+
+def write_batches(driver, records, batch_size=500, embeddings=None):
+    """Write transformed chunks to Neo4j with one UNWIND query per batch and statement type."""
+    stats = {"documents": 0, "entities": 0, "relationships": 0}
+    started = time.monotonic()
+    batch = []
+
+    def flush(batch):
+        documents = [
+            {"id": r["chunk_id"], "text": r["document"]["page_content"], "metadata": r["document"]["metadata"], "embedding": None}
+            for r in batch
+        ]
+        if embeddings is not None:
+            vectors = embeddings.embed_documents([d["text"] for d in documents])
+            for document, vector in zip(documents, vectors):
+                document["embedding"] = vector
+        entities = {n["id"]: n for r in batch for n in r["nodes"]}
+        for r in batch:
+            #Relationship endpoints are entities too even if the LLM left them out of nodes
+            for rel in r["relationships"]:
+                for end in (rel["source"], rel["target"]):
+                    entities.setdefault(end["id"], {"id": end["id"], "type": end["type"], "properties": {}})
+        mentions = [{"document": r["chunk_id"], "entity": n["id"]} for r in batch for n in r["nodes"]]
+        relationships = [
+            {"source": rel["source"]["id"], "target": rel["target"]["id"], "type": rel["type"], "properties": rel["properties"]}
+            for r in batch for rel in r["relationships"]
+        ]
+        driver.execute_query(DOCUMENT_QUERY, rows=documents)
+        driver.execute_query(ENTITY_QUERY, rows=list(entities.values()))
+        driver.execute_query(MENTIONS_QUERY, rows=mentions)
+        driver.execute_query(RELATIONSHIP_QUERY, rows=relationships)
+        stats["documents"] += len(documents)
+        stats["entities"] += len(entities)
+        stats["relationships"] += len(relationships)
+
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+    elapsed = time.monotonic() - started
+    print(f"Wrote {stats['documents']} documents, {stats['entities']} entities and "
+          f"{stats['relationships']} relationships in {elapsed:.1f}s "
+          f"({stats['documents'] / elapsed if elapsed else 0:.1f} documents/s)")
+    return stats
+
+
+def build_embeddings():
+    return CachedEmbeddings(
+        AzureOpenAIEmbeddings(
+            model=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT"),
+            openai_api_key=os.getenv("AZURE_OPENAI_EMBEDDINGS_API"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_EMBEDDINGS_ENDPOINT"),
+            openai_api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+            openai_api_type="azure"
+        ),
+        cache_dir=os.getenv("EMBEDDING_CACHE_DIR", os.path.join(os.path.dirname(__file__), "..", "..", "backend", ".embedding_cache")),
+        namespace=os.getenv("AZURE_OPENAI_EMBEDDINGS_DEPLOYMENT", ""),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the Neo4j knowledge graph from scraped page records")
+    parser.add_argument("--pages", default="../scraping_files/madewithnestle_pages.jsonl", help="JSONL/Parquet file or glob")
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--dedup-threshold", type=float, default=0.85,
+                        help="drop chunks at least this similar to an earlier one, 0 keeps everything")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent LLM graph transformations")
+    parser.add_argument("--checkpoint", default="graph_documents.jsonl", help="append-only store of transformed chunks")
+    parser.add_argument("--batch-size", type=int, default=500, help="chunks per UNWIND write")
+    parser.add_argument("--embed", action="store_true", help="also embed Document text and create the vector index")
+    parser.add_argument("--skip-write", action="store_true", help="only run the LLM transformation")
+    parser.add_argument("--delta", help="scrape_delta.jsonl of an incremental scrape, the Documents of its changed "
+                                        "and removed pages are deleted before writing, e.g. with --pages of the changed pages")
+    args = parser.parse_args()
+
+    started = time.monotonic()
+    loader = PageLoader(args.pages, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    documents = loader.lazy_load()
+    if args.dedup_threshold > 0:
+        #Boilerplate repeated across pages is only sent to the LLM and the embedding API once
+        documents, stats = dedupe(documents, threshold=args.dedup_threshold)
+        print(report(stats))
+    chunks = [(chunk_id(doc), doc) for doc in documents]
+    print(f"{len(chunks)} chunks loaded from {args.pages}")
+
+    store = CheckpointStore(args.checkpoint)
+    try:
+        asyncio.run(transform(chunks, LLMGraphTransformer(llm=build_chat_model()), store, workers=args.workers))
+    finally:
+        store.close()
+
+    if not args.skip_write:
+        driver = GraphDatabase.driver(
+            os.environ["NEO4J_URI"],
+            auth=(os.environ["NEO4J_USERNAME"], os.environ["NEO4J_PASSWORD"]),
+        )
+        try:
+            embeddings = build_embeddings() if args.embed else None
+            dimensions = len(embeddings.embed_query("dimension probe")) if embeddings is not None else None
+            create_indexes(driver, dimensions)
+            if args.delta:
+                retract_documents(driver, load_retracted(args.delta), batch_size=args.batch_size)
+            current = {key for key, _ in chunks}
+            write_batches(driver, current_records(store.records(), current), batch_size=args.batch_size, embeddings=embeddings)
+        finally:
+            driver.close()
+
+    print(f"Done in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import os
+import re
+import sys
+import zlib
+
+import numpy as np
+
+from page_loader import PageLoader
+
+#Token counts come from the backend's context packer, which also falls back when tiktoken cannot load offline
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "backend"))
+from context import count_tokens
+
+#Mersenne prime for the universal hash family h(x) = (a * x + b) mod p
+PRIME = (1 << 61) - 1
+WORD = re.compile(r"\w+")
+
+
+def shingles(text: str, size=5) -> np.ndarray:
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        words = words + [""] * (size - len(words))
+    grams = {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHashLSH:
+    """Near-duplicate detection with MinHash signatures split into LSH bands.
+
+    Two texts land in the same bucket when any band of their signatures matches, candidates
+    are then confirmed by the Jaccard similarity estimated from the full signatures.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=32, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.default_rng(seed)
+        #Kept below 2^32 so a * x + b fits in uint64 for 32-bit shingle hashes
+        self.a = rng.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text)
+        return ((np.outer(hashes, self.a) + self.b) % PRIME).min(axis=0)
+
+    def insert(self, text: str):
+        """Return the index of an earlier near-duplicate of text, otherwise index it and return None."""
+        sig = self.signature(text)
+        keys = [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+        candidates = {c for band, key in zip(self.buckets, keys) for c in band.get(key, ())}
+        for c in sorted(candidates):
+            if np.mean(self.signatures[c] == sig) >= self.threshold:
+                return c
+        index = len(self.signatures)
+        self.signatures.append(sig)
+        for band, key in zip(self.buckets, keys):
+            band.setdefault(key, []).append(index)
+        return None
+
+
+def dedupe(documents, threshold=0.85, num_perm=128, bands=32):
+    """Drop chunks that are near-duplicates of an earlier chunk and return the kept ones with stats.
+
+    Kept chunks list the URLs of the duplicates they stand for in `duplicate_urls`, so a fact
+    repeated across pages still cites every page it came from.
+    """
+    lsh = MinHashLSH(threshold=threshold, num_perm=num_perm, bands=bands)
+    kept = []
+    stats = {"chunks": 0, "kept": 0, "dropped": 0, "tokens": 0, "tokens_saved": 0}
+    for doc in documents:
+        stats["chunks"] += 1
+        tokens = count_tokens(doc.page_content)
+        stats["tokens"] += tokens
+        original = lsh.insert(doc.page_content)
+        if original is None:
+            kept.append(doc)
+            continue
+        stats["dropped"] += 1
+        stats["tokens_saved"] += tokens
+        url = doc.metadata.get("url")
+        target = kept[original].metadata
+        if url and url != target.get("url") and url not in target.get("duplicate_urls", []):
+            target.setdefault("duplicate_urls", []).append(url)
+    stats["kept"] = len(kept)
+    return kept, stats
+
+
+def report(stats: dict) -> str:
+    ratio = stats["tokens_saved"] / stats["tokens"] if stats["tokens"] else 0.0
+    return (f"Dedup: kept {stats['kept']} of {stats['chunks']} chunks, dropped {stats['dropped']} near-duplicates, "
+            f"saved {stats['tokens_saved']} of {stats['tokens']} tokens ({ratio:.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report near-duplicate chunks in the scraped pages")
+    parser.add_argument("--pages", default="../scraping_files/madewithnestle_pages.jsonl")
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.85, help="estimated Jaccard similarity to count as a duplicate")
+    args = parser.parse_args()
+
+    loader = PageLoader(args.pages, chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    _, stats = dedupe(loader.lazy_load(), threshold=args.threshold)
+    print(report(stats))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import glob
+import json
+import os
+import re
+from typing import Iterator
+
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+
+def page_files(pattern: str) -> list[str]:
+    """Files matching the pattern, a Parquet file followed by the -partN files the scraper wrote next to it."""
+    paths = []
+    for path in sorted(glob.glob(pattern)) or [pattern]:
+        if path in paths:
+            continue
+        paths.append(path)
+        root, ext = os.path.splitext(path)
+        if ext == ".parquet" and not re.search(r"-part\d+$", root):
+            parts = glob.glob(f"{glob.escape(root)}-part*{ext}")
+            numbered = [(int(m.group(1)), part) for part in parts if (m := re.search(r"-part(\d+)\.parquet$", part))]
+            paths += [part for _, part in sorted(numbered) if part not in paths]
+    return paths
+
+
+def iter_pages(pattern: str) -> Iterator[dict]:
+    """Stream page records from JSON Lines or Parquet files without loading the corpus."""
+    for path in page_files(pattern):
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches():
+                yield from batch.to_pylist()
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        page = json.loads(line)
+                        #Failed fetches are recorded with an error and no content
+                        if not page.get("error"):
+                            yield page
+
+
+def iter_sections(page: dict) -> Iterator[tuple[list[str], str]]:
+    """Group a page's consecutive blocks that share a heading path."""
+    path, texts = None, []
+    for block in page.get("blocks") or []:
+        heading_path = list(block.get("heading_path") or [])
+        if heading_path != path and texts:
+            yield path, "\n\n".join(texts)
+            texts = []
+        path = heading_path
+        texts.append(block["text"])
+    if texts:
+        yield path, "\n\n".join(texts)
+
+
+def page_metadata(page: dict) -> dict:
+    return {"source": page["url"], "url": page["url"], "title": page.get("title", "")}
+
+
+class PageLoader(BaseLoader):
+    """Lazily load scraped page records as one Document per page, or one per section chunk.
+
+    With `chunk_size` set, chunks never cross a page or section boundary and every chunk
+    starts with the page title and heading path so it still makes sense on its own.
+    """
+
+    def __init__(self, path: str, chunk_size: int = None, chunk_overlap: int = 200):
+        self.path = path
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap) if chunk_size else None
+
+    def lazy_load(self) -> Iterator[Document]:
+        for page in iter_pages(self.path):
+            metadata = page_metadata(page)
+            if self.splitter is None:
+                text = "\n\n".join(block["text"] for block in page.get("blocks") or [])
+                if text:
+                    yield Document(page_content=f"{metadata['title']}\n\n{text}", metadata=metadata)
+                continue
+            for path, text in iter_sections(page):
+                section = " > ".join(path or [])
+                header = " > ".join(part for part in [metadata["title"], section] if part)
+                for i, chunk in enumerate(self.splitter.split_text(text)):
+                    yield Document(
+                        page_content=f"{header}\n\n{chunk}" if header else chunk,
+                        metadata={**metadata, "section": section, "chunk": i},
+                    )
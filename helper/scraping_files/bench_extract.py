@@ -0,0 +1,177 @@
+import argparse
+import glob
+import os
+import time
+import tracemalloc
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+from extract import extract, render_text
+
+DEFAULT_FIXTURES = os.path.join(
+    os.path.dirname(__file__), "..", "..", "frontend", "src", "assets",
+    "Nestlé Brands' Products, Recipes and News _ Made With Nestlé Canada.html",
+)
+
+
+def legacy_extract(url: str, html: str) -> str:
+    """The original BeautifulSoup/html.parser extraction from scrape.py, kept for comparison."""
+    soup = BeautifulSoup(html, "html.parser")
+    out = []
+
+    for script in soup(["script", "style"]):
+        script.extract()
+
+    # Page title
+    title = soup.title.string.strip() if soup.title and soup.title.string else "No Title Found"
+    out.append(f"PAGE TITLE: {title}\n")
+    out.append(f"SOURCE URL: {url}\n\n")
+
+    # Remove navigation, footer, and other non-content elements
+    for element in soup(["nav", "footer", "header", "aside"]):
+        element.extract()
+
+    # Get text from main content areas
+    content_selectors = [
+        'main', 'article', '.content', '#content',
+        '.main-content', '.post-content', '.entry-content'
+    ]
+
+    main_content = None
+    for selector in content_selectors:
+        main_content = soup.select_one(selector)
+        if main_content:
+            break
+
+    # If no main content found, use the whole body
+    if not main_content:
+        main_content = soup.body or soup
+
+    # Extract headings separately for better structure
+    headings = main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+    if headings:
+        out.append("HEADINGS:\n")
+        for heading in headings:
+            heading_text = heading.get_text(strip=True)
+            if heading_text:
+                out.append(f"- {heading.name.upper()}: {heading_text}\n")
+        out.append(f"[Source: {url}]\n\n")
+
+    # Extract paragraphs and other text content
+    text_tags = main_content.find_all(['p', 'li', 'span', 'div', 'article', 'section'])
+
+    paragraphs = []
+    for tag in text_tags:
+        text = tag.get_text(strip=True)
+        if text and len(text) > 20:  #filter out very short texts
+            paragraphs.append(text)
+
+    # Remove duplicates while preserving order
+    seen = set()
+    unique_paragraphs = []
+    for text in paragraphs:
+        if text not in seen:
+            seen.add(text)
+            unique_paragraphs.append(text)
+
+    if unique_paragraphs:
+        out.append("MAIN CONTENT:\n")
+        for paragraph in unique_paragraphs:
+            out.append(f"{paragraph}\n\n")
+        out.append(f"[Source: {url}]\n\n")
+    else:
+        out.append("MAIN CONTENT: No text content found\n")
+        out.append(f"[Source: {url}]\n\n")
+
+    # Gather all image URLs and descriptions
+    images = []
+    for img in soup.find_all('img', src=True):
+        img_url = urljoin(url, img['src'])
+        #Filter out small icons, logos, etc.
+        if not any(skip in img_url.lower() for skip in ['icon', 'logo', 'sprite', 'pixel']):
+            alt_text = img.get('alt', 'No description')
+            images.append((img_url, alt_text))
+
+    if images:
+        out.append("IMAGES:\n")
+        for img_url, alt_text in images:
+            out.append(f"Image URL: {img_url}\n")
+            out.append(f"Description: {alt_text}\n")
+            out.append("---\n")
+        out.append(f"[Source: {url}]\n\n")
+
+    #Extract links for potential relationship mapping
+    links = []
+    for link in soup.find_all('a', href=True):
+        link_url = urljoin(url, link['href'])
+        link_text = link.get_text(strip=True)
+        if link_text and len(link_text) > 3:
+            links.append((link_url, link_text))
+
+    if links:
+        out.append("INTERNAL LINKS:\n")
+        for link_url, link_text in links[:10]:
+            out.append(f"Link: {link_text} -> {link_url}\n")
+        if len(links) > 10:
+            out.append(f"... and {len(links) - 10} more links\n")
+        out.append(f"[Source: {url}]\n\n")
+
+    #add metadata for graph database processing
+    out.append("METADATA FOR GRAPH DB:\n")
+    out.append(f"Source URL: {url}\n")
+    out.append(f"Page Title: {title}\n")
+    out.append(f"Content Sections: Headings={len(headings)}, Paragraphs={len(unique_paragraphs)}, Images={len(images)}, Links={len(links)}\n")
+    return "".join(out)
+
+
+def new_extract(url: str, html: str) -> str:
+    return render_text(extract(url, html))
+
+
+def measure(fn, url, html, repeat):
+    #Best wall time over `repeat` runs, then one traced run for peak memory
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        output = fn(url, html)
+        best = min(best, time.perf_counter() - started)
+    tracemalloc.start()
+    fn(url, html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy and single-pass extractors on saved pages")
+    parser.add_argument("fixtures", nargs="*", help="HTML files or directories of saved pages")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = []
+    for fixture in args.fixtures or [DEFAULT_FIXTURES]:
+        paths.extend(sorted(glob.glob(os.path.join(fixture, "*.htm*"))) if os.path.isdir(fixture) else [fixture])
+
+    totals = {"legacy": [0.0, 0, 0], "single-pass": [0.0, 0, 0]}
+    print(f"{'page':40} {'extractor':12} {'time ms':>9} {'py peak MB':>10} {'output KB':>10}")
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+        url = "https://www.madewithnestle.ca/" + os.path.basename(path)
+        for name, fn in (("legacy", legacy_extract), ("single-pass", new_extract)):
+            elapsed, peak, output = measure(fn, url, html, args.repeat)
+            totals[name][0] += elapsed
+            totals[name][1] = max(totals[name][1], peak)
+            totals[name][2] += len(output.encode("utf-8"))
+            print(f"{os.path.basename(path)[:40]:40} {name:12} {elapsed * 1000:9.1f} {peak / 1e6:10.1f} {len(output.encode('utf-8')) / 1024:10.1f}")
+
+    print()
+    for name, (elapsed, peak, size) in totals.items():
+        print(f"{name:12} total {elapsed * 1000:.1f} ms, python heap peak {peak / 1e6:.1f} MB, output {size / 1024:.1f} KB")
+    if totals["single-pass"][0]:
+        print(f"speedup: {totals['legacy'][0] / totals['single-pass'][0]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
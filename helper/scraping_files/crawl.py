@@ -1,4 +1,4 @@
-import requests
+import json
 import requests
 from bs4 import BeautifulSoup
 import xml.etree.ElementTree as ET
@@ -8,7 +8,8 @@ import time
 # Configuration
 api_key = ''
 sitemap_url = 'https://www.madewithnestle.ca/sitemap.xml' 
-all_urls = set()
+#url -> sitemap <lastmod> (None when the sitemap has no date)
+all_urls = {}
 
 def scrape_url(url):
     payload = {
@@ -24,21 +25,24 @@ def scrape_url(url):
         print(f"Request failed for {url}: {e}")
         return None
 
+def merge_urls(found):
+    #Keep a known lastmod rather than overwrite it with a missing one
+    for url, lastmod in found.items():
+        if lastmod or url not in all_urls:
+            all_urls[url] = lastmod
+
 def parse_sitemap(content, base_url):
-    urls = set()
+    urls = {}
     
     try:
         root = ET.fromstring(content)
         namespaces = {'sitemap': 'http://www.sitemaps.org/schemas/sitemap/0.9'}
         
-        for url_elem in root.findall('.//sitemap:url', namespaces):
-            loc_elem = url_elem.find('sitemap:loc', namespaces)
+        for elem in root.findall('.//sitemap:url', namespaces) + root.findall('.//sitemap:sitemap', namespaces):
+            loc_elem = elem.find('sitemap:loc', namespaces)
+            lastmod_elem = elem.find('sitemap:lastmod', namespaces)
             if loc_elem is not None:
-                urls.add(loc_elem.text)
-        for sitemap_elem in root.findall('.//sitemap:sitemap', namespaces):
-            loc_elem = sitemap_elem.find('sitemap:loc', namespaces)
-            if loc_elem is not None:
-                urls.add(loc_elem.text)
+                urls[loc_elem.text.strip()] = lastmod_elem.text.strip() if lastmod_elem is not None and lastmod_elem.text else None
                 
     except ET.ParseError:
         #If XML parsing fails, try parsing as HTML
@@ -46,7 +50,7 @@ def parse_sitemap(content, base_url):
         for link in soup.find_all('a', href=True):
             full_url = urljoin(base_url, link['href'])
             if 'madewithnestle.ca' in full_url:
-                urls.add(full_url)
+                urls.setdefault(full_url, None)
     
     return urls
 
@@ -62,7 +66,7 @@ for sitemap_url in sitemap_urls:
     response = scrape_url(sitemap_url) 
     if response:
         urls_found = parse_sitemap(response.text, sitemap_url)
-        all_urls.update(urls_found)
+        merge_urls(urls_found)
         print(f"  Found {len(urls_found)} URLs")
         
         # if this is a sitemap index, crawl the individual sitemaps
@@ -72,17 +76,21 @@ for sitemap_url in sitemap_urls:
                 sub_response = scrape_url(url)
                 if sub_response:
                     sub_urls = parse_sitemap(sub_response.text, url)
-                    all_urls.update(sub_urls)
+                    merge_urls(sub_urls)
                     print(f"    Found {len(sub_urls)} additional URLs")
                 time.sleep(0.5)
     
     time.sleep(1)
 
 #Filter out sitemap URLs from final list
-final_urls = {url for url in all_urls if not url.endswith('.xml') or 'sitemap' not in url}
+final_urls = {url: lastmod for url, lastmod in all_urls.items() if not url.endswith('.xml') or 'sitemap' not in url}
 
 print(f"\nTotal URLs found: {len(final_urls)}")
 
 with open("all_madewithnestle_urls2.txt", "w", encoding="utf-8") as f:
     for url in sorted(final_urls):
         f.write(url + "\n")
+
+#lastmod dates let scrape.py --incremental skip pages that have not changed
+with open("sitemap_lastmod.json", "w", encoding="utf-8") as f:
+    json.dump(final_urls, f, indent=1, sort_keys=True)
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import time
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CrawlState:
+    """Per-URL record of sitemap lastmod, HTTP validators and content hash between crawls."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pages = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.pages = json.load(f)
+
+    def save(self):
+        #Write to a temp file first so an interrupted save never corrupts the state
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def is_unchanged_in_sitemap(self, url: str, lastmod) -> bool:
+        #Only trust lastmod when both crawls have one and we already hold the content
+        page = self.pages.get(url)
+        return bool(page and lastmod and page.get("lastmod") == lastmod and page.get("content_hash"))
+
+    def conditional_headers(self, url: str) -> dict:
+        page = self.pages.get(url) or {}
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def touch(self, url: str, lastmod=None):
+        """Mark a page as checked without a content change (304 or lastmod match)."""
+        page = self.pages.setdefault(url, {})
+        if lastmod:
+            page["lastmod"] = lastmod
+        page["checked_at"] = time.time()
+
+    def record(self, url: str, body: str, lastmod=None, headers=None) -> str:
+        """Store a freshly fetched page and return added, changed or unchanged."""
+        headers = headers or {}
+        digest = content_hash(body)
+        page = self.pages.get(url)
+        if page is None or not page.get("content_hash"):
+            change = "added"
+        elif page["content_hash"] != digest:
+            change = "changed"
+        else:
+            change = "unchanged"
+        self.pages[url] = {
+            "lastmod": lastmod or (page or {}).get("lastmod"),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_hash": digest,
+            "checked_at": time.time(),
+        }
+        return change
+
+    def remove_missing(self, urls) -> list[str]:
+        """Forget pages no longer listed by the crawl and return them."""
+        current = set(urls)
+        removed = sorted(url for url in self.pages if url not in current)
+        for url in removed:
+            del self.pages[url]
+        return removed
+
+
+def load_lastmods(path: str) -> dict:
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
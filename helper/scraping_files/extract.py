@@ -0,0 +1,175 @@
+import re
+from urllib.parse import urljoin
+
+from lxml import html as lxml_html
+
+#Elements that start a new text block, everything else is inline and joins its block
+BLOCK_TAGS = {
+    "address", "article", "aside", "blockquote", "dd", "div", "dl", "dt", "figcaption", "figure",
+    "form", "h1", "h2", "h3", "h4", "h5", "h6", "li", "main", "ol", "p", "pre", "section",
+    "table", "tbody", "td", "tfoot", "th", "thead", "tr", "ul",
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "iframe"}
+SKIP_IMAGES = ["icon", "logo", "sprite", "pixel"]
+
+#Same precedence as the old CSS selectors: main, article, .content, #content, .main-content, .post-content, .entry-content
+CONTENT_XPATHS = [
+    "//main",
+    "//article",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' content ')]",
+    "//*[@id='content']",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' main-content ')]",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' post-content ')]",
+    "//*[contains(concat(' ', normalize-space(@class), ' '), ' entry-content ')]",
+]
+
+WHITESPACE = re.compile(r"[\s\u200b]+")
+
+
+def clean(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip()
+
+
+def parse_html(html):
+    #libxml2 is much faster than html.parser, bytes avoid the encoding-declaration error on str input
+    if isinstance(html, str):
+        html = html.encode("utf-8")
+    return lxml_html.document_fromstring(html, parser=lxml_html.HTMLParser(encoding="utf-8", remove_comments=True))
+
+
+def find_main_content(root):
+    for xpath in CONTENT_XPATHS:
+        found = root.xpath(xpath)
+        if found:
+            return found[0]
+    body = root.find("body")
+    return body if body is not None else root
+
+
+def extract(url: str, html, min_chars=20) -> dict:
+    """Walk the page once and return its title, headings, leaf text blocks, images and links.
+
+    Every text node is visited exactly once and belongs to its innermost block element,
+    so nested containers never repeat their children's text. A container's own text before and
+    after a nested block becomes separate blocks, so blocks stay in document order.
+    """
+    root = parse_html(html)
+    title_el = root.find(".//title")
+    title = clean(title_el.text_content()) if title_el is not None else ""
+    main_content = find_main_content(root)
+    body = root.find("body")
+    start = body if body is not None else root
+
+    headings, blocks, images, links = [], [], [], []
+    heading_path = []
+    seen = set()
+    #Text buffers for the open block elements and their tags, the bottom one collects stray text
+    buffers = [[]]
+    block_tags = [None]
+    in_main = [False]
+
+    def flush(parts, tag):
+        text = clean("".join(parts))
+        if not text or not in_main[-1]:
+            return
+        if tag in HEADING_TAGS:
+            level = int(tag[1])
+            del heading_path[level - 1:]
+            heading_path.extend([""] * (level - 1 - len(heading_path)))
+            heading_path.append(text)
+            headings.append({"level": level, "text": text})
+        elif len(text) > min_chars and text not in seen:
+            seen.add(text)
+            blocks.append({"heading_path": [h for h in heading_path if h], "text": text})
+
+    stack = [(start, False)]
+    while stack:
+        el, closing = stack.pop()
+        if closing:
+            tag = el.tag
+            if tag in BLOCK_TAGS:
+                block_tags.pop()
+                flush(buffers.pop(), tag)
+            if el is main_content:
+                in_main.pop()
+            if el.tail:
+                buffers[-1].append(el.tail)
+            continue
+
+        tag = el.tag if isinstance(el.tag, str) else None
+        if tag is None or tag in SKIP_TAGS:
+            if el.tail:
+                buffers[-1].append(el.tail)
+            continue
+
+        if tag in BLOCK_TAGS and len(buffers) > 1:
+            #The parent's text so far is a block of its own, its text after this child starts another
+            flush(buffers[-1], block_tags[-1])
+            buffers[-1] = []
+        if el is main_content:
+            in_main.append(True)
+        if tag == "img" and el.get("src"):
+            img_url = urljoin(url, el.get("src"))
+            if not any(skip in img_url.lower() for skip in SKIP_IMAGES):
+                images.append({"url": img_url, "alt": el.get("alt", "No description")})
+        elif tag == "a" and el.get("href"):
+            link_text = clean(el.text_content())
+            if len(link_text) > 3:
+                links.append({"url": urljoin(url, el.get("href")), "text": link_text})
+
+        if tag in BLOCK_TAGS:
+            buffers.append([])
+            block_tags.append(tag)
+        elif tag == "br":
+            buffers[-1].append(" ")
+        if el.text:
+            buffers[-1].append(el.text)
+        stack.append((el, True))
+        for child in reversed(el):
+            stack.append((child, False))
+
+    return {
+        "url": url,
+        "title": title or "No Title Found",
+        "headings": headings,
+        "blocks": blocks,
+        "images": images,
+        "links": links,
+    }
+
+
+def render_text(page: dict) -> str:
+    """Render an extracted page in the text layout used by madewithnestle_content.txt."""
+    url = page["url"]
+    out = [f"PAGE TITLE: {page['title']}\n", f"SOURCE URL: {url}\n\n"]
+    if page["headings"]:
+        out.append("HEADINGS:\n")
+        for heading in page["headings"]:
+            out.append(f"- H{heading['level']}: {heading['text']}\n")
+        out.append(f"[Source: {url}]\n\n")
+    if page["blocks"]:
+        out.append("MAIN CONTENT:\n")
+        for block in page["blocks"]:
+            out.append(f"{block['text']}\n\n")
+    else:
+        out.append("MAIN CONTENT: No text content found\n")
+    out.append(f"[Source: {url}]\n\n")
+    if page["images"]:
+        out.append("IMAGES:\n")
+        for image in page["images"]:
+            out.append(f"Image URL: {image['url']}\nDescription: {image['alt']}\n---\n")
+        out.append(f"[Source: {url}]\n\n")
+    if page["links"]:
+        out.append("INTERNAL LINKS:\n")
+        for link in page["links"][:10]:
+            out.append(f"Link: {link['text']} -> {link['url']}\n")
+        if len(page["links"]) > 10:
+            out.append(f"... and {len(page['links']) - 10} more links\n")
+        out.append(f"[Source: {url}]\n\n")
+    out.append("METADATA FOR GRAPH DB:\n")
+    out.append(f"Source URL: {url}\n")
+    out.append(f"Page Title: {page['title']}\n")
+    out.append(f"Content Sections: Headings={len(page['headings'])}, Paragraphs={len(page['blocks'])}, "
+               f"Images={len(page['images'])}, Links={len(page['links'])}\n")
+    return "".join(out)
@@ -0,0 +1,187 @@
+import glob
+import json
+import os
+
+from extract import render_text
+
+
+class TextPageWriter:
+    """The original free-form madewithnestle_content.txt layout."""
+
+    def __init__(self, path: str, total: int, append=False):
+        new_file = not append or not os.path.exists(path)
+        self.file = open(path, "w" if new_file else "a", encoding="utf-8")
+        if new_file:
+            # Write header information
+            self.file.write("WEBSITE CONTENT EXTRACTION FOR GRAPH DATABASE\n")
+            self.file.write("=" * 60 + "\n")
+            self.file.write(f"Total URLs to process: {total}\n")
+            self.file.write("=" * 60 + "\n\n")
+
+    def _block(self, i, url, body):
+        self.file.write(f"{'='*100}\n")
+        self.file.write(f"URL {i}: {url}\n")
+        self.file.write(f"{'='*100}\n\n")
+        self.file.write(body)
+        self.file.write(f"{'='*100}\n\n")
+        self.file.flush()  # Ensure content is written immediately
+
+    def write(self, i, page: dict) -> list[str]:
+        self._block(i, page["url"], render_text(page))
+        return [page["url"]]
+
+    def write_error(self, i, url, message):
+        self._block(i, url, f"ERROR PROCESSING URL: {url}\nError: {message}\n")
+
+    def close(self) -> list[str]:
+        self.file.close()
+        return []
+
+
+class JsonlPageWriter:
+    """One JSON record per page: url, title, headings, ordered blocks, images and links."""
+
+    def __init__(self, path: str, total: int = 0, append=False):
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, i, page: dict) -> list[str]:
+        self.file.write(json.dumps(page, ensure_ascii=False) + "\n")
+        self.file.flush()
+        return [page["url"]]
+
+    def write_error(self, i, url, message):
+        self.file.write(json.dumps({"url": url, "error": message}, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self) -> list[str]:
+        self.file.close()
+        return []
+
+
+def page_schema(pa):
+    text_struct = lambda *names: pa.list_(pa.struct([(name, pa.string()) for name in names]))
+    return pa.schema([
+        ("url", pa.string()),
+        ("title", pa.string()),
+        ("headings", pa.list_(pa.struct([("level", pa.int32()), ("text", pa.string())]))),
+        ("blocks", pa.list_(pa.struct([("heading_path", pa.list_(pa.string())), ("text", pa.string())]))),
+        ("images", text_struct("url", "alt")),
+        ("links", text_struct("url", "text")),
+    ])
+
+
+def parquet_parts(path: str) -> list[str]:
+    """The -partN files ParquetPageWriter wrote next to `path`, in order."""
+    root, ext = os.path.splitext(path)
+    parts = []
+    for part in glob.glob(f"{glob.escape(root)}-part*{ext}"):
+        number = part[len(root) + len("-part"):len(part) - len(ext)]
+        if number.isdigit():
+            parts.append((int(number), part))
+    return [part for _, part in sorted(parts)]
+
+
+class ParquetPageWriter:
+    """Page records written as Parquet files of `batch_size` pages.
+
+    A Parquet file is unreadable until its footer is written, so every batch is its own complete file:
+    the first at `path`, later ones as `-partN` files next to it, which a resumed run continues.
+    """
+
+    def __init__(self, path: str, total: int = 0, append=False, batch_size=200):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.pq = pq
+        self.schema = page_schema(pa)
+        self.path = path
+        self.root, self.ext = os.path.splitext(path)
+        if not append:
+            #A fresh run replaces the parts of the previous one, they would be read back with it
+            for stale in [path] + parquet_parts(path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def _next_path(self) -> str:
+        if not os.path.exists(self.path):
+            return self.path
+        part = 1
+        while os.path.exists(f"{self.root}-part{part}{self.ext}"):
+            part += 1
+        return f"{self.root}-part{part}{self.ext}"
+
+    def write(self, i, page: dict) -> list[str]:
+        self.rows.append({name: page.get(name) for name in self.schema.names})
+        if len(self.rows) >= self.batch_size:
+            return self._flush()
+        return []
+
+    def write_error(self, i, url, message):
+        #Failed pages are only reported, they are retried on the next run
+        pass
+
+    def _flush(self) -> list[str]:
+        if not self.rows:
+            return []
+        path = self._next_path()
+        #Written under a temporary name so a crash mid-write never leaves a truncated part behind
+        self.pq.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema), path + ".tmp")
+        os.replace(path + ".tmp", path)
+        urls = [row["url"] for row in self.rows]
+        self.rows = []
+        return urls
+
+    def close(self) -> list[str]:
+        return self._flush()
+
+
+def read_pages(path: str, output_format="jsonl") -> list[dict]:
+    """Every page record in a JSONL file, or a Parquet file and its parts, failed fetches excluded."""
+    if output_format == "parquet":
+        if not os.path.exists(path):
+            return []
+        import pyarrow.parquet as pq
+        pages = [page for part in [path] + parquet_parts(path) for page in pq.read_table(part).to_pylist()]
+    else:
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8") as f:
+            pages = [json.loads(line) for line in f if line.strip()]
+    return [page for page in pages if not page.get("error")]
+
+
+def merge_changed(corpus_path: str, changed_path: str, removed_urls, output_format="jsonl") -> dict:
+    """Fold an incremental run into the full corpus by URL: changed pages replace their old record,
+    added ones are appended and removed ones dropped. The corpus is swapped in whole."""
+    if output_format not in ("jsonl", "parquet"):
+        raise ValueError(f"Cannot merge {output_format} pages, only jsonl and parquet")
+    changed = {page["url"]: page for page in read_pages(changed_path, output_format)}
+    removed = set(removed_urls) - set(changed)
+    corpus = read_pages(corpus_path, output_format)
+    kept = [page for page in corpus if page["url"] not in changed and page["url"] not in removed]
+    pages = kept + list(changed.values())
+
+    tmp_path = corpus_path + ".tmp"
+    if output_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = page_schema(pa)
+        rows = [{name: page.get(name) for name in schema.names} for page in pages]
+        pq.write_table(pa.Table.from_pylist(rows, schema=schema), tmp_path)
+        os.replace(tmp_path, corpus_path)
+        #The merged corpus is one file, its old parts would be read back with it
+        for part in parquet_parts(corpus_path):
+            os.remove(part)
+    else:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for page in pages:
+                f.write(json.dumps(page, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, corpus_path)
+    return {"pages": len(pages), "updated": len(changed), "removed": sum(page["url"] in removed for page in corpus)}
+
+
+#write and close return the urls whose records are now on disk, the scraper checkpoints only those
+WRITERS = {"jsonl": JsonlPageWriter, "parquet": ParquetPageWriter, "text": TextPageWriter}
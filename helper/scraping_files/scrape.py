@@ -1,161 +1,270 @@
-import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin
+import argparse
+import asyncio
+import json
+import os
+import random
 import time
+from urllib.parse import urlsplit, urlunsplit
 
-#Load the files from the sitemap crawl
-with open("all_madewithnestle_urls.txt", "r", encoding="utf-8") as f:
-    urls = [line.strip() for line in f if line.strip()]
-
-api_key = ''
-
-#Text file to save the results for graph database processing
-with open("madewithnestle_content.txt", "w", encoding="utf-8") as txt:
-    # Write header information
-    txt.write("WEBSITE CONTENT EXTRACTION FOR GRAPH DATABASE\n")
-    txt.write("=" * 60 + "\n")
-    txt.write(f"Total URLs to process: {len(urls)}\n")
-    txt.write("=" * 60 + "\n\n")
-    
-    for i, url in enumerate(urls, 1):
+import httpx
+
+from crawl_state import CrawlState, load_lastmods
+from extract import extract
+from page_store import WRITERS, merge_changed
+
+SCRAPERAPI_URL = 'https://api.scraperapi.com/'
+#An incremental run only writes added or changed pages, so it gets its own file next to the full corpus
+FULL_OUTPUT = "madewithnestle_pages.jsonl"
+CHANGED_OUTPUT = "madewithnestle_pages_changed.jsonl"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class ScraperAPIBackend:
+    """Fetch pages through ScraperAPI with JavaScript rendering."""
+
+    def __init__(self, api_key, render=True):
+        self.api_key = api_key
+        self.render = render
+
+    async def fetch(self, client: httpx.AsyncClient, url: str, headers=None) -> httpx.Response:
+        payload = {
+            'api_key': self.api_key,
+            'url': url,
+            'render': 'true' if self.render else 'false'
+        }
+        if headers:
+            #Forward conditional request headers to the target site
+            payload['keep_headers'] = 'true'
+        return await client.get(SCRAPERAPI_URL, params=payload, headers=headers)
+
+
+class DirectBackend:
+    """Fetch pages directly, optionally rewriting the origin to a local fixture server."""
+
+    def __init__(self, origin=None):
+        self.origin = urlsplit(origin) if origin else None
+
+    async def fetch(self, client: httpx.AsyncClient, url: str, headers=None) -> httpx.Response:
+        if self.origin:
+            parts = urlsplit(url)
+            url = urlunsplit((self.origin.scheme, self.origin.netloc, parts.path, parts.query, parts.fragment))
+        return await client.get(url, headers=headers)
+
+
+class TokenBucket:
+    """Allow `rate` requests per second on average with bursts of up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def fetch_with_retry(backend, client, bucket: TokenBucket, url: str, retries=5, base_delay=1.0, headers=None):
+    """Fetch a URL, retrying 429/5xx responses and network errors with exponential backoff."""
+    for attempt in range(retries + 1):
+        await bucket.acquire()
         try:
-            print(f"Scraping ({i}/{len(urls)}): {url}")
-
-            txt.write(f"{'='*100}\n")
-            txt.write(f"URL {i}: {url}\n")
-            txt.write(f"{'='*100}\n\n")
-            
-            payload = {
-                'api_key': api_key,
-                'url': url,
-                'render': 'true'  
-            }
-            
-            #Make request to ScraperAPI
-            response = requests.get('https://api.scraperapi.com/', params=payload)
-            # Raise an exception for bad status codes
-            response.raise_for_status()  
-            
-            soup = BeautifulSoup(response.text, "html.parser")
-            
-            for script in soup(["script", "style"]):
-                script.extract()
-            
-            # Page title
-            title = soup.title.string.strip() if soup.title and soup.title.string else "No Title Found"
-            txt.write(f"PAGE TITLE: {title}\n")
-            txt.write(f"SOURCE URL: {url}\n\n")
-            
-            # Remove navigation, footer, and other non-content elements
-            for element in soup(["nav", "footer", "header", "aside"]):
-                element.extract()
-            
-            # Get text from main content areas
-            content_selectors = [
-                'main', 'article', '.content', '#content', 
-                '.main-content', '.post-content', '.entry-content'
-            ]
-            
-            main_content = None
-            for selector in content_selectors:
-                main_content = soup.select_one(selector)
-                if main_content:
-                    break
-            
-            # If no main content found, use the whole body
-            if not main_content:
-                main_content = soup.body or soup
-            
-            # Extract headings separately for better structure
-            headings = main_content.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            if headings:
-                txt.write("HEADINGS:\n")
-                for heading in headings:
-                    heading_text = heading.get_text(strip=True)
-                    if heading_text:
-                        txt.write(f"- {heading.name.upper()}: {heading_text}\n")
-                txt.write(f"[Source: {url}]\n\n")
-            
-            # Extract paragraphs and other text content
-            text_tags = main_content.find_all(['p', 'li', 'span', 'div', 'article', 'section'])
-            
-            paragraphs = []
-            for tag in text_tags:
-                text = tag.get_text(strip=True)
-                if text and len(text) > 20:  #filter out very short texts
-                    paragraphs.append(text)
-            
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_paragraphs = []
-            for text in paragraphs:
-                if text not in seen:
-                    seen.add(text)
-                    unique_paragraphs.append(text)
-            
-            if unique_paragraphs:
-                txt.write("MAIN CONTENT:\n")
-                for paragraph in unique_paragraphs:
-                    txt.write(f"{paragraph}\n\n")
-                txt.write(f"[Source: {url}]\n\n")
-            else:
-                txt.write("MAIN CONTENT: No text content found\n")
-                txt.write(f"[Source: {url}]\n\n")
-            
-            # Gather all image URLs and descriptions
-            images = []
-            for img in soup.find_all('img', src=True):
-                img_url = urljoin(url, img['src'])
-                #Filter out small icons, logos, etc.
-                if not any(skip in img_url.lower() for skip in ['icon', 'logo', 'sprite', 'pixel']):
-                    alt_text = img.get('alt', 'No description')
-                    images.append((img_url, alt_text))
-            
-            if images:
-                txt.write("IMAGES:\n")
-                for img_url, alt_text in images:
-                    txt.write(f"Image URL: {img_url}\n")
-                    txt.write(f"Description: {alt_text}\n")
-                    txt.write("---\n")
-                txt.write(f"[Source: {url}]\n\n")
-            
-            #Extract links for potential relationship mapping
-            links = []
-            for link in soup.find_all('a', href=True):
-                link_url = urljoin(url, link['href'])
-                link_text = link.get_text(strip=True)
-                if link_text and len(link_text) > 3:
-                    links.append((link_url, link_text))
-            
-            if links:
-                txt.write("INTERNAL LINKS:\n")
-                for link_url, link_text in links[:10]:
-                    txt.write(f"Link: {link_text} -> {link_url}\n")
-                if len(links) > 10:
-                    txt.write(f"... and {len(links) - 10} more links\n")
-                txt.write(f"[Source: {url}]\n\n")
-            
-            #add metadata for graph database processing
-            txt.write("METADATA FOR GRAPH DB:\n")
-            txt.write(f"Source URL: {url}\n")
-            txt.write(f"Page Title: {title}\n")
-            txt.write(f"Content Sections: Headings={len(headings)}, Paragraphs={len(unique_paragraphs)}, Images={len(images)}, Links={len(links)}\n")
-            txt.write(f"{'='*100}\n\n")
-            
-            txt.flush()  # Ensure content is written immediately
-        
-            time.sleep(1)
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Request failed for {url}: {e}"
-            print(error_msg)
-            txt.write(f"ERROR PROCESSING URL: {url}\n")
-            txt.write(f"Error: {error_msg}\n")
-            txt.write(f"{'='*100}\n\n")
-            
-        except Exception as e:
-            error_msg = f"Failed to scrape {url}: {e}"
-            print(error_msg)
-            txt.write(f"ERROR PROCESSING URL: {url}\n")
-            txt.write(f"Error: {error_msg}\n")
-            txt.write(f"{'='*100}\n\n")
+            response = await backend.fetch(client, url, headers=headers)
+        except httpx.TransportError as e:
+            if attempt == retries:
+                raise
+            print(f"  Network error for {url} ({e}), retrying")
+            delay = base_delay * 2 ** attempt
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            #Respect Retry-After when the server sends one
+            retry_after = response.headers.get('Retry-After', '')
+            delay = float(retry_after) if retry_after.isdigit() else base_delay * 2 ** attempt
+            print(f"  {response.status_code} for {url}, retrying in {delay:.1f}s")
+        await asyncio.sleep(delay + random.uniform(0, base_delay))
+
+
+def load_removed(delta_path: str) -> list[str]:
+    if not delta_path or not os.path.exists(delta_path):
+        return []
+    with open(delta_path, "r", encoding="utf-8") as f:
+        return [entry["url"] for entry in map(json.loads, filter(str.strip, f)) if entry["change"] == "removed"]
+
+
+def load_checkpoint(path: str) -> set:
+    if not os.path.exists(path):
+        return set()
+    with open(path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+async def scrape(urls, backend, output_path, checkpoint_path, concurrency=8, rate=4.0, retries=5, timeout=70.0,
+                 state: CrawlState = None, lastmods=None, delta_path=None, output_format="jsonl"):
+    """Scrape urls into output_path, one record per page as they finish. With a CrawlState only
+    added or changed pages are written and the delta is appended to delta_path as JSON lines."""
+    lastmods = lastmods or {}
+    done = load_checkpoint(checkpoint_path)
+    pending = [(i, url) for i, url in enumerate(urls, 1) if url not in done]
+    if done:
+        print(f"Resuming: {len(done)} URLs already scraped, {len(pending)} left")
+
+    stats = {"ok": 0, "failed": 0, "bytes": 0, "added": 0, "changed": 0, "unchanged": 0, "removed": 0}
+    delta = open(delta_path, "a" if done else "w", encoding="utf-8") if state is not None and delta_path else None
+
+    def emit(url, change):
+        stats[change] += 1
+        if delta is not None and change != "unchanged":
+            delta.write(json.dumps({"url": url, "change": change}) + "\n")
+            delta.flush()
+
+    if state is not None:
+        for url in state.remove_missing(urls):
+            emit(url, "removed")
+        #Pages whose sitemap lastmod has not moved are skipped without a request
+        skipped = [(i, url) for i, url in pending if state.is_unchanged_in_sitemap(url, lastmods.get(url))]
+        for _, url in skipped:
+            state.touch(url, lastmods.get(url))
+            emit(url, "unchanged")
+        skipped_urls = {url for _, url in skipped}
+        pending = [(i, url) for i, url in pending if url not in skipped_urls]
+        print(f"Incremental: {len(skipped)} pages unchanged by lastmod, {len(pending)} to check")
+
+    bucket = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.monotonic()
+
+    #Append so an interrupted run keeps what it already wrote
+    writer = WRITERS[output_format](output_path, len(urls), append=bool(done))
+    with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+        def mark_done(url):
+            checkpoint.write(url + "\n")
+            checkpoint.flush()
+
+        async def worker(i, url):
+            async with semaphore:
+                headers = state.conditional_headers(url) if state is not None else None
+                try:
+                    response = await fetch_with_retry(backend, client, bucket, url, retries=retries, headers=headers)
+                    if response.status_code == 304 and state is not None:
+                        state.touch(url, lastmods.get(url))
+                        emit(url, "unchanged")
+                        mark_done(url)
+                        return
+                    # Raise an exception for bad status codes
+                    response.raise_for_status()
+                    #Parsing is CPU bound, keep it off the event loop
+                    page = await asyncio.to_thread(extract, url, response.text)
+                except Exception as e:
+                    error_msg = f"Failed to scrape {url}: {e}"
+                    print(error_msg)
+                    writer.write_error(i, url, error_msg)
+                    stats["failed"] += 1
+                    return
+                stats["ok"] += 1
+                stats["bytes"] += len(response.content)
+                if state is not None:
+                    body = json.dumps(page, sort_keys=True, ensure_ascii=False)
+                    change = state.record(url, body, lastmods.get(url), response.headers)
+                    emit(url, change)
+                    if change == "unchanged":
+                        mark_done(url)
+                        return
+                #Buffered records are checkpointed once the writer has them on disk
+                for written in writer.write(i, page):
+                    mark_done(written)
+                print(f"Scraped ({i}/{len(urls)}): {url}")
+
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        try:
+            async with httpx.AsyncClient(timeout=timeout, limits=limits, follow_redirects=True) as client:
+                await asyncio.gather(*(worker(i, url) for i, url in pending))
+        finally:
+            for written in writer.close():
+                mark_done(written)
+            if state is not None:
+                state.save()
+            if delta is not None:
+                delta.close()
+
+    #A finished run starts from scratch next time, only an interrupted one resumes
+    if not stats["failed"] and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+    elapsed = time.monotonic() - started
+    print(f"\nScraped {stats['ok']} pages, {stats['failed']} failed in {elapsed:.1f}s "
+          f"({stats['ok'] / elapsed if elapsed else 0:.2f} pages/s, {stats['bytes'] / 1e6:.1f} MB)")
+    if state is not None:
+        print(f"Delta: {stats['added']} added, {stats['changed']} changed, "
+              f"{stats['removed']} removed, {stats['unchanged']} unchanged")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape the Made with Nestlé pages listed by crawl.py")
+    parser.add_argument("--input", default="all_madewithnestle_urls.txt")
+    parser.add_argument("--output", help=f"defaults to {FULL_OUTPUT}, or {CHANGED_OUTPUT} with --incremental")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="jsonl",
+                        help="jsonl/parquet page records, or the old text layout")
+    parser.add_argument("--checkpoint", default="scrape_checkpoint.txt")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and scrape everything again")
+    parser.add_argument("--backend", choices=["scraperapi", "direct"], default="scraperapi")
+    parser.add_argument("--origin", help="with --backend direct, send requests to this origin (e.g. a local fixture server)")
+    parser.add_argument("--api-key", default=os.getenv("SCRAPERAPI_KEY", ""))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=4.0, help="requests per second")
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--incremental", action="store_true",
+                        help="only write added or changed pages and record the delta")
+    parser.add_argument("--state", default="crawl_state.json")
+    parser.add_argument("--lastmod", default="sitemap_lastmod.json", help="url -> lastmod written by crawl.py")
+    parser.add_argument("--delta", default="scrape_delta.jsonl")
+    parser.add_argument("--corpus", default=FULL_OUTPUT,
+                        help="with --incremental, the full corpus that changed pages are merged into by URL")
+    args = parser.parse_args()
+    if args.output is None:
+        args.output = CHANGED_OUTPUT if args.incremental else FULL_OUTPUT
+    elif args.incremental and os.path.abspath(args.output) == os.path.abspath(args.corpus):
+        parser.error(f"--incremental only writes changed pages, it would replace the full corpus in {args.corpus}")
+
+    #Load the files from the sitemap crawl
+    with open(args.input, "r", encoding="utf-8") as f:
+        urls = [line.strip() for line in f if line.strip()]
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    if args.backend == "scraperapi":
+        backend = ScraperAPIBackend(args.api_key)
+    else:
+        backend = DirectBackend(args.origin)
+
+    state = CrawlState(args.state) if args.incremental else None
+    asyncio.run(scrape(
+        urls, backend, args.output, args.checkpoint,
+        concurrency=args.concurrency, rate=args.rate, retries=args.retries,
+        state=state, lastmods=load_lastmods(args.lastmod), delta_path=args.delta,
+        output_format=args.format,
+    ))
+
+    if args.incremental:
+        #Keep the full corpus current, a later full build would otherwise read the old versions
+        if args.format == "text":
+            print(f"Not merging into {args.corpus}, text output has no page records")
+        else:
+            merged = merge_changed(args.corpus, args.output, load_removed(args.delta), args.format)
+            print(f"Merged into {args.corpus}: {merged['updated']} pages updated, "
+                  f"{merged['removed']} removed, {merged['pages']} in total")
+
+
+if __name__ == "__main__":
+    main()